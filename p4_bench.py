@@ -0,0 +1,157 @@
+# scaling benchmarks for the simulation core
+#
+# usage: python p4_bench.py run [--ticks N] [--seeds 13,14] [--quick] [--storage arrays]
+#                                [--path-workers N] [--out results.json]
+#        python p4_bench.py compare before.json after.json
+
+import argparse
+import json
+import platform
+import sys
+import time
+import p4_game
+
+# world_specification counts are scaled by these factors...
+POPULATIONS = [1, 10, 40]
+# ...in worlds of these sizes (obstacles and resources also grow with area)
+WORLD_SIZES = [800, 1600]
+
+BASE_SPECIFICATION = {
+  'nests': 2,
+  'obstacles': 25,
+  'resources': 5,
+  'slugs': 5,
+  'mantises': 5,
+}
+
+def make_cases(populations=POPULATIONS, sizes=WORLD_SIZES, seeds=[13]):
+  cases = []
+  for size in sizes:
+    area = (size / 800.0)**2
+    for scale in populations:
+      for seed in seeds:
+        spec = dict(BASE_SPECIFICATION)
+        spec['slugs'] *= scale
+        spec['mantises'] *= scale
+        spec['obstacles'] = int(spec['obstacles'] * area)
+        spec['resources'] = int(spec['resources'] * area)
+        spec['worldgen_seed'] = seed
+        name = '%dpx-x%d-seed%d' % (size, scale, seed)
+        cases.append({'name': name, 'width': size, 'height': size, 'specification': spec})
+  return cases
+
+def percentile(ordered, fraction):
+  return ordered[min(len(ordered)-1, int(round(fraction*(len(ordered)-1))))]
+
+def run_case(case, brains, ticks, storage=None, path_workers=None):
+  dt = p4_game.SIMULATION_TICK_DELAY_MS/1000.0
+  world = p4_game.World(case['width'], case['height'], storage)
+  world.populate(case['specification'], brains.brain_classes)
+  if path_workers:
+    world.start_path_workers(path_workers)
+
+  profiler = world.enable_profiling(window=1)
+  latencies = []
+  try:
+    for i in range(ticks):
+      start = time.time()
+      world.update(dt)
+      latencies.append(time.time() - start)
+  finally:
+    world.stop_path_workers()
+
+  total = sum(latencies)
+  ordered = sorted(latencies)
+  return {
+    'name': case['name'],
+    'width': case['width'],
+    'height': case['height'],
+    'specification': case['specification'],
+    'ticks': ticks,
+    'storage': storage or 'objects',
+    'path_workers': path_workers or 0,
+    'ticks_per_second': ticks / total if total else float('inf'),
+    'p50_ms': 1000*percentile(ordered, 0.50),
+    'p99_ms': 1000*percentile(ordered, 0.99),
+    'phases': dict((phase, {'ms_per_tick': 1000*seconds/ticks})
+                   for phase, seconds in profiler.total_seconds.items()
+                   if phase != 'tick'),
+    'counts': dict((name, float(n)/ticks) for name, n in profiler.total_counts.items()),
+  }
+
+def run(cases, brains, ticks, out=None, storage=None, path_workers=None):
+  results = {
+    'python': platform.python_version(),
+    'machine': platform.platform(),
+    'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+    'cases': [],
+  }
+  for case in cases:
+    result = run_case(case, brains, ticks, storage, path_workers)
+    results['cases'].append(result)
+    print "%-22s %8.1f ticks/s  p50 %7.2f ms  p99 %7.2f ms  %s  %s" % (
+        result['name'], result['ticks_per_second'], result['p50_ms'], result['p99_ms'],
+        '  '.join('%s %.2f' % (name, phase['ms_per_tick'])
+                  for name, phase in sorted(result['phases'].items())),
+        '  '.join('%s/tick %.1f' % (name, n)
+                  for name, n in sorted(result['counts'].items())))
+  if out:
+    with open(out, 'w') as f:
+      json.dump(results, f, indent=1, sort_keys=True)
+  return results
+
+def compare(before, after):
+  """print how each case's numbers moved between two saved runs"""
+  old = dict((case['name'], case) for case in before['cases'])
+  for case in after['cases']:
+    prior = old.get(case['name'])
+    if not prior:
+      print "%-22s (new)" % case['name']
+      continue
+    print "%-22s ticks/s %8.1f -> %8.1f (x%.2f)  p99 %7.2f -> %7.2f ms" % (
+        case['name'], prior['ticks_per_second'], case['ticks_per_second'],
+        case['ticks_per_second'] / prior['ticks_per_second'],
+        prior['p99_ms'], case['p99_ms'])
+    for name in sorted(set(prior['phases']) | set(case['phases'])):
+      a = prior['phases'].get(name, {}).get('ms_per_tick', 0)
+      b = case['phases'].get(name, {}).get('ms_per_tick', 0)
+      print "    %-18s %8.2f -> %8.2f ms/tick" % (name, a, b)
+    for name in sorted(set(prior.get('counts', {})) | set(case.get('counts', {}))):
+      a = prior.get('counts', {}).get(name, 0)
+      b = case.get('counts', {}).get(name, 0)
+      print "    %-18s %8.1f -> %8.1f per tick" % (name, a, b)
+
+def main(argv):
+  parser = argparse.ArgumentParser(description='benchmark the simulation core')
+  commands = parser.add_subparsers(dest='command')
+  run_parser = commands.add_parser('run')
+  run_parser.add_argument('--brains', default='p4_brains')
+  run_parser.add_argument('--ticks', type=int, default=500)
+  run_parser.add_argument('--seeds', default='13')
+  run_parser.add_argument('--quick', action='store_true', help='smallest world and populations only')
+  run_parser.add_argument('--storage', choices=['objects', 'arrays'], default='objects')
+  run_parser.add_argument('--path-workers', type=int, default=0,
+                          help='build go_to fields in this many processes')
+  run_parser.add_argument('--out')
+  compare_parser = commands.add_parser('compare')
+  compare_parser.add_argument('before')
+  compare_parser.add_argument('after')
+  args = parser.parse_args(argv[1:])
+
+  if args.command == 'run':
+    seeds = [int(seed) for seed in args.seeds.split(',')]
+    if args.quick:
+      cases = make_cases(POPULATIONS[:2], WORLD_SIZES[:1], seeds)
+    else:
+      cases = make_cases(seeds=seeds)
+    storage = None if args.storage == 'objects' else args.storage
+    run(cases, p4_game.load_brains(args.brains), args.ticks, args.out, storage, args.path_workers)
+  else:
+    with open(args.before) as f:
+      before = json.load(f)
+    with open(args.after) as f:
+      after = json.load(f)
+    compare(before, after)
+
+if __name__ == '__main__':
+  main(sys.argv)
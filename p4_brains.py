@@ -1,5 +1,7 @@
 
+import math
 import random
+import numpy
 from slug_machine import SlugStateMachine
 
 # EXAMPLE STATE MACHINE
@@ -21,7 +23,7 @@ class MantisBrain:
         self.body.go_to((x,y))
         self.body.set_alarm(random.random()*10)
 
-      elif message == 'collide' and details['what'] == 'Slug':
+      elif message in ('collide', 'collide_enter') and details['what'] == 'Slug':
         # a slug bumped into us; get curious
         self.state = 'curious'
         self.body.set_alarm(1) # think about this for a sec
@@ -39,11 +41,61 @@ class MantisBrain:
           else:
             self.body.follow(self.target)
           self.body.set_alarm(1)
-      elif message == 'collide' and details['what'] == 'Slug':
+      elif message in ('collide', 'collide_enter', 'collide_stay') and details['what'] == 'Slug':
         # we meet again!
         slug = details['who']
         slug.amount -= 0.01 # take a tiny little bite
-    
+
+class HerdingMantisBrain(MantisBrain):
+  """a MantisBrain whose idle mantises wander in herds: those waking
+  together split into groups of up to wander_group that head for one
+  random point over a shared field, and wake-ups are rounded up to
+  wander_beat so that more of them wake together. use it in place of
+  MantisBrain in brain_classes."""
+  wander_group = 8 # at most this many wanderers share one random point
+  wander_beat = 0.5 # idle mantises wake on multiples of this many seconds (None: whenever)
+
+  @classmethod
+  def handle_events_batch(cls, bodies, events):
+    # everything but wandering goes through handle_event as usual
+    wanderers = []
+    for body, queued in zip(bodies, events):
+      brain = body.brain
+      wander = False
+      for message, details in queued:
+        if brain.state is 'idle' and message == 'timer':
+          wander = True
+        else:
+          brain.handle_event(message, details)
+      if wander and brain.state is 'idle':
+        wanderers.append(body)
+    if wanderers:
+      cls.wander(wanderers)
+
+  @classmethod
+  def wander(cls, bodies):
+    # the idle timer, for all of them at once: one draw of the random module
+    # seeds the rest
+    world = bodies[0].world
+    rng = numpy.random.RandomState(random.getrandbits(32))
+    n = len(bodies)
+    spots = int(math.ceil(float(n) / cls.wander_group))
+    xs = rng.random_sample(spots)*world.width
+    ys = rng.random_sample(spots)*world.height
+    which = (rng.permutation(n) % spots).tolist()
+    delays = rng.random_sample(n)*10
+    groups = {} # spot -> [body]
+    for body, spot in zip(bodies, which):
+      groups.setdefault(spot, []).append(body)
+    for k in range(spots):
+      if k in groups:
+        world.go_to_together(groups[k], (float(xs[k]), float(ys[k])))
+    beat = cls.wander_beat
+    for body, delay in zip(bodies, delays.tolist()):
+      if beat:
+        delay = math.ceil((world.time + delay) / beat) * beat - world.time
+      body.set_alarm(delay)
+
 class SlugBrain:
 
   def __init__(self, body):
@@ -0,0 +1,125 @@
+import collections
+
+class UniformGrid(object):
+  """spatial hash of GameObjects that is kept across ticks
+
+  small objects (radius up to half a cell) live in the one cell holding
+  their center, so anything small they touch is in the surrounding 3x3
+  cells; large objects such as nests and big obstacles are listed in every
+  cell a small object touching them could be centered in, which costs a
+  lot of cells once but nothing while they sit still. refresh() rebins
+  only objects that moved into different cells. everything is kept per
+  class so queries can skip classes they don't care about."""
+
+  def __init__(self, cell_size=50):
+    self.cell_size = cell_size
+    self.small = collections.defaultdict(dict) # class -> (ci,cj) -> [obj]
+    self.large = collections.defaultdict(dict) # class -> (ci,cj) -> [obj]
+    self.large_objects = collections.defaultdict(list) # class -> [obj]
+    self.entries = {} # obj -> [position, radius, cells]
+
+  def cells(self, position, radius):
+    """cell of a small object, or the inclusive cell range of a large one"""
+    if position is None:
+      return None
+    s = float(self.cell_size)
+    if 2*radius <= s:
+      return (int(position[0]//s), int(position[1]//s))
+    reach = radius + s/2
+    return (int((position[0] - reach)//s), int((position[0] + reach)//s),
+            int((position[1] - reach)//s), int((position[1] + reach)//s))
+
+  def insert(self, obj):
+    if obj in self.entries:
+      return
+    cells = self.cells(obj.position, obj.radius)
+    self.entries[obj] = [obj.position, obj.radius, cells]
+    self._bin(obj, cells)
+
+  def remove(self, obj):
+    entry = self.entries.pop(obj, None)
+    if entry:
+      self._unbin(obj, entry[2])
+
+  def refresh(self, objects):
+    """rebin any of these objects that moved or changed size (objects that
+    were never inserted are left alone)"""
+    entries = self.entries
+    for obj in objects:
+      entry = entries.get(obj)
+      if entry is not None and (obj.position != entry[0] or obj.radius != entry[1]):
+        entry[0], entry[1] = obj.position, obj.radius
+        cells = self.cells(obj.position, obj.radius)
+        if cells != entry[2]:
+          self._unbin(obj, entry[2])
+          self._bin(obj, cells)
+          entry[2] = cells
+
+  def classes(self):
+    """every class with something binned, in a stable order"""
+    return sorted(set(self.small) | set(self.large_objects), key=lambda c: c.__name__)
+
+  def query(self, obj, classes=None):
+    """objects (of the given classes, or any) that might overlap obj, each
+    once and in a stable order"""
+    entry = self.entries.get(obj)
+    if entry is None or entry[2] is None:
+      return []
+    cells = entry[2]
+    found = []
+    for clazz in classes or self.classes():
+      small = self.small.get(clazz)
+      if small:
+        if len(cells) == 2:
+          ci, cj = cells
+          for i in (ci-1, ci, ci+1):
+            for j in (cj-1, cj, cj+1):
+              found.extend(small.get((i, j), ()))
+        else:
+          i_lo, i_hi, j_lo, j_hi = cells
+          for i in range(i_lo, i_hi+1):
+            for j in range(j_lo, j_hi+1):
+              found.extend(small.get((i, j), ()))
+      if clazz in self.large_objects:
+        if len(cells) == 2:
+          found.extend(self.large[clazz].get(cells, ()))
+        else:
+          found.extend(self.large_objects[clazz])
+    if obj in found:
+      found.remove(obj)
+    return found
+
+  def _bin(self, obj, cells):
+    if cells is None:
+      return
+    clazz = obj.__class__
+    if len(cells) == 2:
+      self.small[clazz].setdefault(cells, []).append(obj)
+    else:
+      self.large_objects[clazz].append(obj)
+      large = self.large[clazz]
+      i_lo, i_hi, j_lo, j_hi = cells
+      for i in range(i_lo, i_hi+1):
+        for j in range(j_lo, j_hi+1):
+          large.setdefault((i, j), []).append(obj)
+
+  def _unbin(self, obj, cells):
+    if cells is None:
+      return
+    clazz = obj.__class__
+    if len(cells) == 2:
+      self._drop(self.small[clazz], cells, obj)
+    else:
+      self.large_objects[clazz].remove(obj)
+      if not self.large_objects[clazz]:
+        del self.large_objects[clazz]
+      i_lo, i_hi, j_lo, j_hi = cells
+      for i in range(i_lo, i_hi+1):
+        for j in range(j_lo, j_hi+1):
+          self._drop(self.large[clazz], (i, j), obj)
+
+  def _drop(self, bins, key, obj):
+    cell = bins[key]
+    cell.remove(obj)
+    if not cell:
+      del bins[key]
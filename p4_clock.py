@@ -0,0 +1,78 @@
+import time
+
+class FixedStep(object):
+  """drives World.update in fixed steps of simulated time
+
+  wall time since the last frame(), scaled by speed, piles up in an
+  accumulator and is spent one step at a time. a frame runs at most
+  max_steps steps; whatever is left beyond one more step after that is
+  dropped (and counted) instead of being owed to later frames, so a slow
+  stretch doesn't turn into a burst of catch-up work. the part of a step
+  left over is alpha, which drawing can use to blend between the
+  positions before and after the last step."""
+
+  clock = staticmethod(time.time)
+
+  def __init__(self, world, step=0.01, max_steps=5, speed=1.0, interpolate=False):
+    self.world = world
+    self.step = step
+    self.max_steps = max_steps
+    self.speed = speed
+    self.interpolate = interpolate
+    self.accumulator = 0.0
+    self.last = None
+    self.previous = {} # moving obj -> position before the last step
+    self.steps = 0
+    self.frames = 0
+    self.dropped = 0.0 # simulated seconds given up to the catch-up cap
+    self.rate = 0.0 # steps per wall second over the last measurement
+    self.rate_started = None
+    self.rate_steps = 0
+
+  @property
+  def alpha(self):
+    """how far, as a fraction of a step, wall time is past the last step"""
+    return self.accumulator / self.step
+
+  def frame(self, now=None):
+    """run the steps that came due since the last call; returns how many"""
+    if now is None:
+      now = self.clock()
+    if self.last is None:
+      self.last = self.rate_started = now
+    self.accumulator += (now - self.last) * self.speed
+    self.last = now
+
+    n = int(self.accumulator / self.step)
+    if n > self.max_steps:
+      self.dropped += (n - self.max_steps) * self.step
+      self.accumulator -= (n - self.max_steps) * self.step
+      n = self.max_steps
+    world = self.world
+    for k in range(n):
+      if self.interpolate and k == n - 1:
+        self.previous = dict((obj, obj.position) for obj in world.all_objects
+                             if not obj.static)
+      world.update(self.step)
+      self.accumulator -= self.step
+    self.steps += n
+    self.frames += 1
+
+    self.rate_steps += n
+    if now - self.rate_started >= 1.0:
+      self.rate = self.rate_steps / (now - self.rate_started)
+      self.rate_started = now
+      self.rate_steps = 0
+    return n
+
+  def position(self, obj):
+    """where to draw obj: between its last two positions if interpolating"""
+    current = obj.position
+    before = self.previous.get(obj)
+    if not self.interpolate or not before or not current:
+      return current
+    a = self.alpha
+    return (before[0] + a*(current[0] - before[0]), before[1] + a*(current[1] - before[1]))
+
+  def summary(self):
+    return 'speed %gx %.0f steps/s dropped %.2fs' % (self.speed, self.rate, self.dropped)
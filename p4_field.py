@@ -0,0 +1,583 @@
+import array
+import collections
+import heapq
+import math
+import numpy
+
+FREE_COST = 1
+BLOCKED_COST = 1e6
+INF = float('inf')
+
+# buckets smaller than this expand faster in plain python than in numpy
+SMALL_BUCKET = 32
+
+# flat-index neighbor order matches the (-1,0),(1,0),(0,-1),(0,1) sweep of
+# the original dict-based search
+def _neighbor_offsets(width):
+  return numpy.array([-width, width, -1, 1])
+
+def rasterize(position, radius, expansion, bin_size):
+  """return the (i, j) grid cells whose corners fall inside a circular
+  blocker grown by expansion, in one vectorized pass"""
+
+  x, y = position
+  i_lo = int((x - radius)/bin_size - 1)
+  i_hi = int((x + radius)/bin_size + 1)
+  j_lo = int((y - radius)/bin_size - 1)
+  j_hi = int((y + radius)/bin_size + 1)
+  dx = x - numpy.arange(i_lo, i_hi+1)*bin_size
+  dy = y - numpy.arange(j_lo, j_hi+1)*bin_size
+  dist = numpy.sqrt(dx[:,None]*dx[:,None] + dy[None,:]*dy[None,:])
+  ii, jj = numpy.nonzero(dist < radius + expansion)
+  return ii + i_lo, jj + j_lo
+
+def _bounds(footprints):
+  """concatenated cells and (i_lo, i_hi, j_lo, j_hi) of some footprints"""
+  ii = numpy.concatenate([f[0] for f in footprints])
+  jj = numpy.concatenate([f[1] for f in footprints])
+  return ii, jj, (ii.min(), ii.max(), jj.min(), jj.max())
+
+class BlockerLayer(object):
+  """a reusable raster of blockers that stay put, counting how many cover
+  each cell so that single blockers can be left out of a search"""
+
+  def __init__(self, footprints):
+    self.footprints = footprints # obj -> (ii, jj)
+    nonempty = [f for f in footprints.values() if len(f[0])]
+    self.origin = None
+    if nonempty:
+      ii, jj, (i_lo, i_hi, j_lo, j_hi) = _bounds(nonempty)
+      self.origin = (int(i_lo), int(j_lo))
+      self.counts = numpy.zeros((int(i_hi - i_lo) + 1, int(j_hi - j_lo) + 1), dtype=int)
+      numpy.add.at(self.counts, (ii - i_lo, jj - j_lo), 1)
+
+  def bounds(self):
+    if self.origin is None:
+      return None
+    ni, nj = self.counts.shape
+    return (self.origin[0], self.origin[0] + ni - 1, self.origin[1], self.origin[1] + nj - 1)
+
+  def blocked(self, exclude=()):
+    """boolean raster of cells still covered once exclude is left out"""
+    counts = self.counts
+    excluded = [self.footprints[obj] for obj in exclude if obj in self.footprints]
+    if excluded:
+      counts = counts.copy()
+      for ii, jj in excluded:
+        counts[ii - self.origin[0], jj - self.origin[1]] -= 1
+    return counts > 0
+
+  def window(self, i_lo, i_hi, j_lo, j_hi, exclude=()):
+    """blocked() cropped or padded to the inclusive cell range given"""
+    out = numpy.zeros((i_hi - i_lo + 1, j_hi - j_lo + 1), dtype=bool)
+    if self.origin is None:
+      return out
+    ni, nj = self.counts.shape
+    a_lo, a_hi = max(i_lo, self.origin[0]), min(i_hi, self.origin[0] + ni - 1)
+    b_lo, b_hi = max(j_lo, self.origin[1]), min(j_hi, self.origin[1] + nj - 1)
+    if a_lo <= a_hi and b_lo <= b_hi:
+      out[a_lo-i_lo:a_hi-i_lo+1, b_lo-j_lo:b_hi-j_lo+1] = self.blocked(exclude)[
+          a_lo-self.origin[0]:a_hi-self.origin[0]+1, b_lo-self.origin[1]:b_hi-self.origin[1]+1]
+    return out
+
+class Grid(object):
+  """a padded rectangle of cells covering the map, every blocked cell, and
+  the search start; border cells never exist so the search needs no bounds
+  checks"""
+
+  def __init__(self, shape, footprints, start, layer=None, exclude=()):
+    ni, nj = shape
+    i_lo, i_hi = min(0, start[0]), max(ni-1, start[0])
+    j_lo, j_hi = min(0, start[1]), max(nj-1, start[1])
+    footprints = [f for f in footprints if len(f[0])]
+    boxes = []
+    if footprints:
+      ii, jj, box = _bounds(footprints)
+      boxes.append(box)
+    if layer and layer.bounds():
+      boxes.append(layer.bounds())
+    for box in boxes:
+      i_lo, i_hi = min(i_lo, box[0]), max(i_hi, box[1])
+      j_lo, j_hi = min(j_lo, box[2]), max(j_hi, box[3])
+
+    # one cell of padding on every side
+    self.origin = (int(i_lo) - 1, int(j_lo) - 1)
+    self.shape = (int(i_hi - i_lo) + 3, int(j_hi - j_lo) + 3)
+
+    self.blocked = numpy.zeros(self.shape, dtype=bool)
+    if layer and layer.bounds():
+      li, lj = layer.origin[0] - self.origin[0], layer.origin[1] - self.origin[1]
+      lni, lnj = layer.counts.shape
+      self.blocked[li:li+lni, lj:lj+lnj] = layer.blocked(exclude)
+    if footprints:
+      self.blocked[ii - self.origin[0], jj - self.origin[1]] = True
+
+    self.exists = self.blocked.copy()
+    self.exists[-self.origin[0]:ni-self.origin[0],
+                -self.origin[1]:nj-self.origin[1]] = True
+    self.inside = (0, ni-1, 0, nj-1) # cells sure to exist
+
+    self.start = (start[0] - self.origin[0])*self.shape[1] + (start[1] - self.origin[1])
+
+class WindowGrid(object):
+  """a Grid over just the inclusive cell range window of the map (grown to
+  take in the start), blocked where the layer is; cells outside the window
+  never exist, so a search over it costs the window's area, not the map's"""
+
+  def __init__(self, window, start, layer):
+    i_lo, i_hi, j_lo, j_hi = window
+    i_lo, i_hi = min(i_lo, start[0]), max(i_hi, start[0])
+    j_lo, j_hi = min(j_lo, start[1]), max(j_hi, start[1])
+    self.origin = (int(i_lo) - 1, int(j_lo) - 1)
+    self.shape = (int(i_hi - i_lo) + 3, int(j_hi - j_lo) + 3)
+    self.blocked = numpy.zeros(self.shape, dtype=bool)
+    self.blocked[1:-1, 1:-1] = layer.window(i_lo, i_hi, j_lo, j_hi)
+    self.exists = numpy.zeros(self.shape, dtype=bool)
+    self.exists[1:-1, 1:-1] = True
+    self.inside = (i_lo, i_hi, j_lo, j_hi)
+    self.start = (start[0] - self.origin[0])*self.shape[1] + (start[1] - self.origin[1])
+
+class Wavefront(object):
+  """bucketed dijkstra over a flat Grid; since a cell's entry cost is the
+  same from every side, each cell is reached exactly once and a whole bucket
+  can be expanded with array operations
+
+  values holds, per cell, the distance of the neighbor it was first reached
+  from (inf until then), which is what the original search recorded"""
+
+  def __init__(self, grid, watch=()):
+    size = grid.blocked.size
+    self.grid = grid
+
+    # numpy views share memory with these buffers, so large buckets expand
+    # with array operations and small ones with plain indexing
+    self.free_buf = bytearray((~grid.blocked).ravel().tostring())
+    self.unreached_buf = bytearray(grid.exists.ravel().tostring())
+    self.values_buf = array.array('d', [numpy.inf]) * size
+    self.free_cells = numpy.frombuffer(self.free_buf, dtype=bool)
+    self.unreached = numpy.frombuffer(self.unreached_buf, dtype=bool)
+    self.values = numpy.frombuffer(self.values_buf, dtype=float)
+    self.offsets = _neighbor_offsets(grid.shape[1])
+    self.stamp = numpy.empty(size, dtype=int)
+
+    # expand() reports when one of these cells gets reached
+    self.watch_buf = None
+    if len(watch):
+      self.watch_buf = bytearray(size)
+      for c in watch:
+        self.watch_buf[c] = 1
+      self.watched = numpy.frombuffer(self.watch_buf, dtype=bool)
+
+    self.values_buf[grid.start] = 0
+    self.unreached_buf[grid.start] = 0
+    self.buckets = {0: [[grid.start]]}
+    self.keys = [0]
+
+  def next_key(self):
+    """distance of the next bucket; every cell reached from here on gets at
+    least this value"""
+    return self.keys[0] if self.keys else numpy.inf
+
+  def expand(self):
+    """expand the nearest bucket, returning whether a watched cell was
+    reached, or None once the search is exhausted"""
+    if not self.keys:
+      return None
+
+    d = heapq.heappop(self.keys)
+    frontier = self.buckets.pop(d)
+    count = sum(len(f) for f in frontier)
+    touched = False
+
+    if count < SMALL_BUCKET:
+      width = self.grid.shape[1]
+      unreached_buf, values_buf, free_buf = self.unreached_buf, self.values_buf, self.free_buf
+      next_free, next_blocked = [], []
+      for cells in frontier:
+        for c in cells:
+          for n in (c-width, c+width, c-1, c+1):
+            if unreached_buf[n]:
+              unreached_buf[n] = 0
+              values_buf[n] = d
+              if free_buf[n]:
+                next_free.append(n)
+              else:
+                next_blocked.append(n)
+      steps = [(next_free, FREE_COST), (next_blocked, BLOCKED_COST)]
+      if self.watch_buf:
+        watch_buf = self.watch_buf
+        touched = any(watch_buf[n] for n in next_free) or any(watch_buf[n] for n in next_blocked)
+
+    else:
+      frontier = numpy.concatenate([numpy.asarray(f, dtype=int) for f in frontier])
+      next_c = (frontier[:,None] + self.offsets).ravel()
+      next_c = next_c[self.unreached[next_c]]
+      # drop duplicates by letting the last write to a scratch slot win
+      order = numpy.arange(next_c.size)
+      self.stamp[next_c] = order
+      next_c = next_c[self.stamp[next_c] == order]
+      self.unreached[next_c] = False
+      self.values[next_c] = d
+      free = self.free_cells[next_c]
+      steps = [(next_c[free], FREE_COST), (next_c[~free], BLOCKED_COST)]
+      if self.watch_buf:
+        touched = bool(self.watched[next_c].any())
+
+    for cells, step in steps:
+      if len(cells):
+        next_d = d + step
+        if next_d in self.buckets:
+          self.buckets[next_d].append(cells)
+        else:
+          self.buckets[next_d] = [cells]
+          heapq.heappush(self.keys, next_d)
+
+    return touched
+
+def wavefront(grid):
+  """run a Wavefront to exhaustion and return its per-cell values"""
+  search = Wavefront(grid)
+  while search.expand() is not None:
+    pass
+  return search.values.reshape(grid.shape).copy()
+
+def nearest(grid, positions, bin_size, center, limit=numpy.inf, outside='center'):
+  """goal-bounded search from the grid's start toward several candidate
+  positions, stopping as soon as the first one with the smallest
+  interpolated distance (as a finished DistanceField with the same outside
+  policy would report it) is certain; candidates farther than limit are
+  ignored
+
+  returns (index into positions, distance), or (None, None)"""
+
+  origin, shape = grid.origin, grid.shape
+  if outside == 'edge':
+    inside = grid.inside
+    x_lo, x_hi = inside[0]*bin_size, inside[1]*bin_size
+    y_lo, y_hi = inside[2]*bin_size, inside[3]*bin_size
+  elif outside not in OUTSIDE:
+    raise ValueError("unknown outside policy: %r" % outside)
+  cands = []
+  watch = []
+  for x, y in positions:
+    beyond = 0
+    if outside == 'edge':
+      # clamped into the inside cells, which all exist and get reached, so
+      # missing corners are only ever weighted by zero and nothing caps
+      # the unknown ones
+      cx, cy = min(max(x, x_lo), x_hi), min(max(y, y_lo), y_hi)
+      beyond = math.sqrt((x-cx)*(x-cx) + (y-cy)*(y-cy))/bin_size
+      x, y = cx, cy
+      default, cap = 0, numpy.inf
+    else:
+      dx = x - center[0]
+      dy = y - center[1]
+      default = cap = 2*math.sqrt(dx*dx+dy*dy)
+    alpha = float(x % bin_size)/bin_size
+    beta = float(y % bin_size)/bin_size
+    i, j = int(x / bin_size) - origin[0], int(y / bin_size) - origin[1]
+    corners = []
+    for ci, cj in [(i,j), (i+1,j), (i,j+1), (i+1,j+1)]:
+      c = ci*shape[1] + cj
+      if 0 <= ci < shape[0] and 0 <= cj < shape[1] and (grid.exists[ci,cj] or c == grid.start):
+        corners.append(c)
+        watch.append(c)
+      else:
+        corners.append(None) # never searched, always the default
+    weights = [(1-alpha)*(1-beta), alpha*(1-beta), (1-alpha)*beta, alpha*beta]
+    cands.append((alpha, beta, default, cap, beyond, corners, weights))
+  if not cands:
+    return None, None
+
+  search = Wavefront(grid, watch)
+  values = search.values_buf
+
+  def interpolate(cand, unknown):
+    # cells never reached keep the default, so it caps the unknown ones;
+    # corners weighted by zero read 0, which leaves the sum as it is
+    alpha, beta, default, cap, beyond, corners, weights = cand
+    unknown = min(unknown, cap)
+    a, b, c, d = [0 if w == 0 else default if k is None else
+                  values[k] if values[k] != numpy.inf else unknown
+                  for k, w in zip(corners, weights)]
+    ab = (1-alpha)*a + alpha*b
+    cd = (1-alpha)*c + alpha*d
+    return (1-beta)*ab + beta*cd + beyond
+
+  pending = range(len(cands))
+  best, best_value = None, None
+  threshold = numpy.inf
+  while True:
+    touched = search.expand()
+    exhausted = touched is None
+    k = search.next_key()
+    if not (touched or exhausted or k >= threshold):
+      continue
+
+    # settle candidates whose corners are all known
+    unsettled = []
+    for index in pending:
+      alpha, beta, default, cap, beyond, corners, weights = cands[index]
+      if exhausted or all(c is None or values[c] != numpy.inf or w == 0
+                          for c, w in zip(corners, weights)):
+        value = interpolate(cands[index], cap)
+        if value <= limit and (best is None or value < best_value or
+                               (value == best_value and index < best)):
+          best, best_value = index, value
+      else:
+        unsettled.append(index)
+    pending = unsettled
+
+    # unknown corners will be at least k, so see if anyone could still win
+    target = limit if best is None else best_value
+    threshold = -numpy.inf
+    for index in pending:
+      bound = interpolate(cands[index], k)
+      if bound < target or (bound == target and (best is None or index < best)):
+        alpha, beta, default, cap, beyond, corners, weights = cands[index]
+        known = beyond + sum(w*values[c] for c, w in zip(corners, weights)
+                             if c is not None and values[c] != numpy.inf)
+        known += sum(w*default for c, w in zip(corners, weights) if c is None)
+        unknown = sum(w for c, w in zip(corners, weights)
+                      if c is not None and values[c] == numpy.inf)
+        if known + unknown*cap < target:
+          threshold = numpy.inf # only settling those corners can tell
+        else:
+          threshold = max(threshold, (target - known)/unknown)
+    if threshold == -numpy.inf:
+      return best, best_value
+
+# what a field reads off its grid, see DistanceField
+OUTSIDE = ('center', 'edge')
+
+class DistanceField(object):
+  """result of World.build_distance_field: call it with a position for a
+  bilinearly interpolated distance or use lookup_many for arrays of them
+
+  outside says what positions off the searched cells read. with 'center'
+  every missing corner reads twice the distance (in pixels) to center, as
+  the game always did. with 'edge' positions are first clamped into the
+  inside cell range, which always exists, and read the value there plus
+  the distance (in cells) they were moved, so the field keeps rising and
+  leads back in."""
+
+  def __init__(self, values, origin, bin_size, center, outside='center', inside=None):
+    if outside not in OUTSIDE:
+      raise ValueError("unknown outside policy: %r" % outside)
+    self.values = values
+    self.origin = origin
+    self.bin_size = bin_size
+    self.center = center
+    self.outside = outside
+    self.inside = inside
+    if outside == 'edge':
+      self.box = (inside[0]*bin_size, inside[1]*bin_size,
+                  inside[2]*bin_size, inside[3]*bin_size)
+    # a flat array.array keeps single lookups free of numpy scalar overhead
+    # and, unlike nested lists, takes no time to build from values
+    self.ni, self.nj = values.shape
+    self.flat = array.array('d', numpy.ascontiguousarray(values, dtype=float).tostring())
+    self._flow = None
+
+  def __getstate__(self):
+    # the flat copies and flow are rebuilt from values, so snapshots stay small
+    return (self.values, self.origin, self.bin_size, self.center, self.outside, self.inside)
+
+  def __setstate__(self, state):
+    self.__init__(*state)
+
+  def __call__(self, position): # bilinear interpolation
+    x,y = position
+    bin_size = self.bin_size
+    beyond = 0
+    if self.outside == 'edge':
+      x_lo, x_hi, y_lo, y_hi = self.box
+      if not (x_lo <= x <= x_hi and y_lo <= y <= y_hi):
+        cx, cy = min(max(x, x_lo), x_hi), min(max(y, y_lo), y_hi)
+        beyond = math.sqrt((x-cx)*(x-cx) + (y-cy)*(y-cy))/bin_size
+        x, y = cx, cy
+      default = 0 # only ever weighted by zero
+    else:
+      dx = x - self.center[0]
+      dy = y - self.center[1]
+      default = 2*math.sqrt(dx*dx+dy*dy)
+    alpha = float(x % bin_size)/bin_size
+    beta = float(y % bin_size)/bin_size
+    i, j = int(x / bin_size) - self.origin[0], int(y / bin_size) - self.origin[1]
+    nj = self.nj
+    if 0 <= i and i+1 < self.ni and 0 <= j and j+1 < nj:
+      flat = self.flat
+      k = i*nj + j
+      a, c = flat[k], flat[k+1]
+      b, d = flat[k+nj], flat[k+nj+1]
+      if a == INF: a = default
+      if b == INF: b = default
+      if c == INF: c = default
+      if d == INF: d = default
+    else:
+      a = self._get(i, j, default)
+      b = self._get(i+1, j, default)
+      c = self._get(i, j+1, default)
+      d = self._get(i+1, j+1, default)
+    ab = (1-alpha)*a + alpha*b
+    cd = (1-alpha)*c + alpha*d
+    abcd = (1-beta)*ab + beta*cd
+    return abcd + beyond
+
+  def _get(self, i, j, default):
+    if 0 <= i < self.ni and 0 <= j < self.nj:
+      v = self.flat[i*self.nj + j]
+      if v != INF:
+        return v
+    return default
+
+  def lookup_many(self, positions):
+    """interpolate an (n,2) array of positions at once"""
+    positions = numpy.asarray(positions, dtype=float).reshape(-1, 2)
+    x, y = positions[:,0], positions[:,1]
+    bin_size = self.bin_size
+    beyond = 0
+    if self.outside == 'edge':
+      x_lo, x_hi, y_lo, y_hi = self.box
+      cx, cy = numpy.clip(x, x_lo, x_hi), numpy.clip(y, y_lo, y_hi)
+      beyond = numpy.sqrt((x-cx)*(x-cx) + (y-cy)*(y-cy))/bin_size
+      x, y = cx, cy
+      default = 0
+    else:
+      dx = x - self.center[0]
+      dy = y - self.center[1]
+      default = 2*numpy.sqrt(dx*dx+dy*dy)
+    alpha = numpy.mod(x, bin_size)/bin_size
+    beta = numpy.mod(y, bin_size)/bin_size
+    i = numpy.trunc(x / bin_size).astype(int) - self.origin[0]
+    j = numpy.trunc(y / bin_size).astype(int) - self.origin[1]
+
+    ni, nj = self.values.shape
+    def get(i, j):
+      inside = (0 <= i) & (i < ni) & (0 <= j) & (j < nj)
+      v = self.values[numpy.clip(i, 0, ni-1), numpy.clip(j, 0, nj-1)]
+      return numpy.where(inside & (v != numpy.inf), v, default)
+
+    a = get(i, j)
+    b = get(i+1, j)
+    c = get(i, j+1)
+    d = get(i+1, j+1)
+    ab = (1-alpha)*a + alpha*b
+    cd = (1-alpha)*c + alpha*d
+    return (1-beta)*ab + beta*cd + beyond
+
+  def flow(self):
+    """per-cell slopes of the bilinear patch, (b-a, d-c, c-a, d-b) for the
+    cell with corners a=(i,j) b=(i+1,j) c=(i,j+1) d=(i+1,j+1), as numpy
+    arrays and as a flat array.array of four per cell; NaN where a corner
+    is missing. built on first use and kept with the field."""
+    if self._flow is None:
+      v = self.values
+      a, b, c, d = v[:-1,:-1], v[1:,:-1], v[:-1,1:], v[1:,1:]
+      whole = numpy.isfinite(a) & numpy.isfinite(b) & numpy.isfinite(c) & numpy.isfinite(d)
+      with numpy.errstate(invalid='ignore'): # inf-inf at missing corners
+        slopes = numpy.where(whole, numpy.array([b-a, d-c, c-a, d-b]), numpy.nan)
+      cells = array.array('d', numpy.ascontiguousarray(numpy.rollaxis(slopes, 0, 3)).tostring())
+      self._flow = (slopes, cells)
+    return self._flow
+
+  def gradient(self, position, margin):
+    """(d/dx, d/dy) of the interpolated field in units of the cell, with one
+    cell lookup; None where probes margin away from position could leave
+    its cell or the cell has a missing corner, since a finite difference
+    there does not follow a single bilinear patch"""
+    x, y = position
+    if x < margin or y < margin:
+      return None
+    if self.outside == 'edge':
+      x_lo, x_hi, y_lo, y_hi = self.box
+      if not (x_lo <= x - margin and x + margin < x_hi and y_lo <= y - margin and y + margin < y_hi):
+        return None
+    bin_size = self.bin_size
+    i = int((x - margin) / bin_size)
+    j = int((y - margin) / bin_size)
+    if i != int((x + margin) / bin_size) or j != int((y + margin) / bin_size):
+      return None
+    i -= self.origin[0]
+    j -= self.origin[1]
+    nj = self.nj - 1
+    if not (0 <= i < self.ni - 1 and 0 <= j < nj):
+      return None
+    cells = self.flow()[1]
+    k = 4*(i*nj + j)
+    ba = cells[k]
+    if ba != ba: # NaN, a corner is missing
+      return None
+    dc, ca, db = cells[k+1], cells[k+2], cells[k+3]
+    alpha = float(x % bin_size)/bin_size
+    beta = float(y % bin_size)/bin_size
+    return ((1-beta)*ba + beta*dc, (1-alpha)*ca + alpha*db)
+
+  def gradient_many(self, x, y, margin):
+    """gradient for arrays of coordinates; returns gx, gy and a mask of the
+    entries that got one (the rest are NaN)"""
+    bin_size = self.bin_size
+    i = numpy.trunc((x - margin) / bin_size).astype(int)
+    j = numpy.trunc((y - margin) / bin_size).astype(int)
+    ok = (x >= margin) & (y >= margin)
+    if self.outside == 'edge':
+      x_lo, x_hi, y_lo, y_hi = self.box
+      ok &= (x_lo <= x - margin) & (x + margin < x_hi) & (y_lo <= y - margin) & (y + margin < y_hi)
+    ok &= (i == numpy.trunc((x + margin) / bin_size)) & (j == numpy.trunc((y + margin) / bin_size))
+    i -= self.origin[0]
+    j -= self.origin[1]
+    slopes = self.flow()[0]
+    ni, nj = slopes.shape[1:]
+    ok &= (0 <= i) & (i < ni) & (0 <= j) & (j < nj)
+    ba, dc, ca, db = slopes[:, numpy.clip(i, 0, ni-1), numpy.clip(j, 0, nj-1)]
+    ok &= numpy.isfinite(ba)
+    alpha = numpy.mod(x, bin_size)/bin_size
+    beta = numpy.mod(y, bin_size)/bin_size
+    gx = numpy.where(ok, (1-beta)*ba + beta*dc, numpy.nan)
+    gy = numpy.where(ok, (1-alpha)*ca + alpha*db, numpy.nan)
+    return gx, gy, ok
+
+class FieldCache(object):
+  """least-recently-used store of finished distance fields"""
+
+  def __init__(self, capacity=64):
+    self.capacity = capacity
+    self.fields = collections.OrderedDict()
+    self.hits = 0
+    self.misses = 0
+
+  def get(self, key):
+    field = self.fields.pop(key, None)
+    if field is None:
+      self.misses += 1
+    else:
+      self.hits += 1
+      self.fields[key] = field # most recently used goes last
+    return field
+
+  def put(self, key, field):
+    self.fields[key] = field
+    while len(self.fields) > self.capacity:
+      self.fields.popitem(last=False)
+
+  def clear(self):
+    self.fields.clear()
+
+  def rekey(self, function):
+    """keep the fields function gives a new key for, under that key, and
+    drop the rest"""
+    fields = collections.OrderedDict()
+    for key, field in self.fields.items():
+      key = function(key)
+      if key is not None:
+        fields[key] = field
+    self.fields = fields
+
+def solve(grid, bin_size, center, outside='center'):
+  """run a full search over a Grid and wrap the result as a DistanceField"""
+  return DistanceField(wavefront(grid), grid.origin, bin_size, center, outside, grid.inside)
+
+def build(shape, footprints, start, bin_size, center, outside='center'):
+  """search outward from the start cell over a map of the given shape (in
+  cells) with the given blocker footprints"""
+  return solve(Grid(shape, footprints, start), bin_size, center, outside)
@@ -1,238 +1,781 @@
 
-import Tkinter
+try:
+  import Tkinter
+except ImportError: # headless machines may not have Tk at all
+  Tkinter = None
 import collections
+import heapq
+import importlib
+import itertools
+import logging
+import multiprocessing
 import random
 import sys
 import math
-import heapq
+import numpy
+import p4_broadphase
+import p4_clock
+import p4_field
+import p4_hpa
+import p4_profile
+import p4_registry
+import p4_render
+import p4_store
+import p4_telemetry
+
+class Contact(object):
+  """details of a contact event, readable like the {'what': ..., 'who': ...}
+  dict that comes with 'collide'"""
+  __slots__ = ('what', 'who')
+
+  def __init__(self, what, who):
+    self.what = what
+    self.who = who
+
+  def __getitem__(self, key):
+    return getattr(self, key)
+
+# a move order being handed to several selected units at once
+GroupOrder = collections.namedtuple('GroupOrder', 'target members offsets')
+
+class PathRequest(object):
+  """a distance field go_to is waiting for, built by World.path_pool (or on
+  the spot without one) and handed out at the start of tick `due`"""
+
+  def __init__(self, key, due, job=None, field=None):
+    self.key = key
+    self.due = due
+    self.job = job # multiprocessing AsyncResult while the field is out
+    self.field = field
+    self.followers = [] # (obj, offset)
+
+  def wait(self):
+    if self.job is not None:
+      self.field = self.job.get()
+      self.job = None
+    return self.field
+
+  def __getstate__(self):
+    # a snapshot takes the finished field, never the worker's handle
+    self.wait()
+    return self.__dict__
 
 class World:
-  """container for many GameObject instances and some global parameters"""
+  """container for many GameObject instances and some global parameters
+
+  with storage='arrays', controllers of the same type are stepped together
+  over a p4_store.EntityStore of positions and speeds"""
 
-  def __init__(self, width, height):
+  def __init__(self, width, height, storage=None, field_bin_size=20):
     self.width = width
     self.height = height
-    self.all_objects = []
-    self.objects_by_class = collections.defaultdict(list)
+    # p4_registry.Registry views, safe to iterate while objects come and go
+    self.all_objects = p4_registry.Registry()
+    self.objects_by_class = collections.defaultdict(p4_registry.Registry)
+    self.entities = {} # entity_id -> registered obj
+    self.updating = False # destroy() waits for the end of the tick while set
+    self.doomed = p4_registry.Registry() # destroyed during this tick
     self.sel_a = None
     self.sel_b = None
     self.selection = {}
     self.time = 0
+    self.field_bin_size = field_bin_size # pixels per distance field cell
+    # how distance fields read off the map, see p4_field.DistanceField
+    self.field_outside = 'center'
+    self.field_cache = p4_field.FieldCache()
+    self.blocker_version = 0
+    self.static_layers = {} # expansion -> BlockerLayer
+    # 'hpa' routes go_to through a p4_hpa.Hierarchy of the obstacles and
+    # small fields per leg instead of one field over the whole map
+    self.pathfinder = 'field'
+    self.cluster_size = 10
+    self.hierarchies = {} # expansion -> p4_hpa.Hierarchy
+    # moving blockers (obj -> (position, radius)) as they were when
+    # blocker_version last changed; fields are built from these, and they
+    # are only taken again once one has moved more than blocker_tolerance
+    self.dynamic_blockers = None
+    self.dynamic_layers = {} # expansion -> BlockerLayer of dynamic_blockers
+    self.dynamic_checked = None # tick of the last check_dynamic_blockers
+    self.blocker_tolerance = field_bin_size/2.0
+    self.broadphase = p4_broadphase.UniformGrid()
+    self.collision_rules = dict(COLLISION_RULES)
+    self.profiler = None
+    self.telemetry = None # p4_telemetry.Telemetry from enable_telemetry
+    self.field_builds = 0 # distance fields built so far
+    self.nearest_searches = 0 # search_nearest runs that searched the map
+    self.path_fallbacks = 0 # plan_path trips that couldn't reach the target
+    self.alarms = [] # heap of (deadline, sequence, obj)
+    self.alarm_sequence = itertools.count()
+    self.group_order = None # GroupOrder while a move order is being handed out
+    self.formation_spacing = None # spread group move orders over a grid this wide
+    self.renderer = None # p4_render.CanvasRenderer once drawn
+    self.tick = 0 # completed calls to update
+    self.entity_ids = itertools.count(1)
+    self.recorder = None # p4_replay.Recorder while a session is recorded
+    # with a path_latency, go_to fields come due that many ticks after they
+    # were asked for, whatever the path_pool took to build them, so runs
+    # stay reproducible; None builds them inside go_to
+    self.path_latency = None
+    self.path_pool = None # multiprocessing.Pool from start_path_workers
+    self.path_requests = collections.OrderedDict() # key -> PathRequest
+    # 'collide' tells brains about every overlap on every tick as it is
+    # found; 'contacts' tracks contacts across ticks and queues
+    # collide_enter/collide_exit (and collide_stay every contact_stay_ticks,
+    # or never if None) for delivery once per tick. reactions that go on
+    # for as long as a contact lasts, like healing at a nest, need the
+    # stay events
+    self.collision_events = 'collide'
+    self.contact_stay_ticks = 1
+    self.contacts = collections.OrderedDict() # (a, b) -> tick it began
+    self.touching = collections.OrderedDict() # (a, b) seen this tick
+    self.events = collections.OrderedDict() # obj -> [(message, details)]
+    self.store = None
+    if storage == 'arrays':
+      self.store = p4_store.EntityStore()
+    elif storage is not None:
+      raise ValueError("unknown storage: %r" % storage)
 
   def register(self, obj):
-    """add a GameObject to the all_objects and objects_by_class lists"""
+    """add a GameObject to the all_objects and objects_by_class views"""
     assert isinstance(obj, GameObject)
 
     if obj not in self.all_objects:
-      self.all_objects.append(obj)
+      if obj.entity_id is None:
+        # handed out in registration order, so the same seed gives the same ids
+        obj.entity_id = next(self.entity_ids)
+      self.all_objects.add(obj)
+      self.entities[obj.entity_id] = obj
+      self.blockers_changed(obj.static)
+      self.broadphase.insert(obj)
+      if obj.timer_deadline is not None:
+        # an alarm that came due while unregistered goes off now
+        self.schedule_alarm(obj, obj.timer_deadline)
+
+    if self.objects_by_class[obj.__class__].add(obj) and isinstance(obj, Obstacle):
+      self.obstacle_changed(obj)
 
-    clazz = obj.__class__
-    if obj not in self.objects_by_class[clazz]:
-      self.objects_by_class[clazz].append(obj)
- 
   def unregister(self, obj):
-    """remove a GameObject from the all_objects and objects_by_class lists"""
+    """remove a GameObject from the all_objects and objects_by_class views"""
     assert isinstance(obj, GameObject)
-    if obj in self.all_objects:
-      self.all_objects.remove(obj)
+    if self.all_objects.remove(obj):
+      del self.entities[obj.entity_id]
+      self.doomed.remove(obj)
+      self.blockers_changed(obj.static)
+      self.broadphase.remove(obj)
+      if self.renderer:
+        self.renderer.forget(obj)
 
-    clazz = obj.__class__
-    if obj in self.objects_by_class[clazz]:
-      self.objects_by_class[clazz].remove(obj)
+    if self.objects_by_class[obj.__class__].remove(obj) and isinstance(obj, Obstacle):
+      self.obstacle_changed(obj)
 
     if obj in self.selection:
       del self.selection[obj]
 
-  def draw(self,canvas):
-    """draw the whole game world to the canvas"""
-
-    canvas.delete(Tkinter.ALL)
-
-    # backdrop
-    canvas.create_rectangle(0, 0, self.width, self.height, fill='#eba', outline='')
-
-    # child objects
-    for obj in self.all_objects:
-      obj.draw(canvas)
-
-    # highlight selected objects
-    if self.selection:
-      for c in self.selection:
-        canvas.create_rectangle(
-            c.position[0]-c.radius-1,
-            c.position[1]-c.radius-1,
-            c.position[0]+c.radius+1,
-            c.position[1]+c.radius+1,
-            outline='green',
-            fill='',
-            width=2.0)
-
-    # draw the user's partial selection box 
-    if self.sel_a and self.sel_b:
-      top_left = (min(self.sel_a[0], self.sel_b[0]), min(self.sel_a[1], self.sel_b[1]))
-      bottom_right = (max(self.sel_a[0], self.sel_b[0]), max(self.sel_a[1], self.sel_b[1]))
-      canvas.create_rectangle(
-          top_left[0],
-          top_left[1],
-          bottom_right[0],
-          bottom_right[1],
-          outline='green',
-          fill='',
-          width=2.0)
+  def destroy(self, obj):
+    """unregister obj, or while update is running, mark it to be
+    unregistered when the tick is over"""
+    if self.updating:
+      if obj in self.all_objects:
+        self.doomed.add(obj)
+    else:
+      self.unregister(obj)
+
+  def entity(self, entity_id):
+    """the registered object with this entity_id, or None"""
+    return self.entities.get(entity_id)
+
+  def draw(self, canvas, clock=None):
+    """draw the whole game world to the canvas, updating the canvas items
+    left from the previous frame rather than starting over"""
+    if self.renderer is None or self.renderer.canvas is not canvas:
+      self.renderer = p4_render.CanvasRenderer(canvas)
+    self.renderer.draw(self, clock)
+
+  def blockers_changed(self, static=False):
+    """bump the blocker version, dropping cached distance fields and the
+    moving blockers' rasters (and the static ones if a static object was
+    involved)"""
+    self.blocker_version += 1
+    self.field_cache.clear()
+    self.dynamic_blockers = None
+    self.dynamic_layers.clear()
+    if static:
+      self.static_layers.clear()
+
+  def check_dynamic_blockers(self):
+    """at most once a tick, notice if any moving blocker got further than
+    blocker_tolerance from where the cached fields have it"""
+    recorded = self.dynamic_blockers
+    if recorded is not None and self.dynamic_checked == self.tick:
+      return
+    self.dynamic_checked = self.tick
+    movers = [obj for obj in self.all_objects if not obj.static]
+    if recorded is not None:
+      moved = self.blockers_moved(recorded, movers)
+      if not moved:
+        if moved is not None:
+          return
+        self.blockers_changed()
+      else:
+        self.blockers_moved_away(moved)
+    self.dynamic_blockers = collections.OrderedDict(
+        (obj, (obj.position, obj.radius)) for obj in movers)
+
+  def blockers_moved(self, recorded, movers):
+    """the movers further than blocker_tolerance from where they were
+    recorded, or None if they aren't the recorded ones any more"""
+    if len(recorded) != len(movers):
+      return None
+    tolerance = self.blocker_tolerance
+    moved = []
+    for (obj, (position, radius)), mover in zip(recorded.items(), movers):
+      if mover is not obj or mover.radius != radius:
+        return None
+      now = mover.position
+      if now != position and (not now or not position or
+                              abs(now[0] - position[0]) > tolerance or
+                              abs(now[1] - position[1]) > tolerance):
+        moved.append(obj)
+    return moved
+
+  def blockers_moved_away(self, moved):
+    """bump the blocker version for movers that have moved, keeping the
+    fields (cached or on their way) that exclude all of them, like a
+    group's field while only the group moves; the movers are all taken
+    again"""
+    version = self.blocker_version
+    self.blocker_version += 1
+    self.dynamic_layers.clear()
+    moved = frozenset(moved)
+
+    def carry(key):
+      start, expansion, built, exclude = key
+      if built == version and moved <= exclude:
+        return (start, expansion, self.blocker_version, exclude)
+    self.field_cache.rekey(carry)
+    # the others still come due for whoever asked, just not for anyone new
+    requests = collections.OrderedDict()
+    for key, request in self.path_requests.items():
+      request.key = carry(key) or key
+      requests[request.key] = request
+    self.path_requests = requests
+
+  def dynamic_layer(self, expansion):
+    """rasterized footprints of the moving blockers as of the blocker
+    version, built once per expansion"""
+    layer = self.dynamic_layers.get(expansion)
+    if layer is None:
+      bin_size = self.field_bin_size
+      layer = p4_field.BlockerLayer(dict(
+          (obj, p4_field.rasterize(position, radius, expansion, bin_size))
+          for obj, (position, radius) in self.dynamic_blockers.items() if position))
+      self.dynamic_layers[expansion] = layer
+    return layer
+
+  def footprint(self, obj, expansion, exclude=()):
+    """(x, y, reach) of the blocker obj itself is in this version's fields,
+    or None if they leave it out"""
+    entry = self.dynamic_blockers and self.dynamic_blockers.get(obj)
+    if not entry or not entry[0] or obj in exclude:
+      return None
+    (x, y), radius = entry
+    return (x, y, radius + expansion)
+
+  def static_layer(self, expansion):
+    """rasterized footprints of all static objects, built once per expansion"""
+    layer = self.static_layers.get(expansion)
+    if layer is None:
+      bin_size = self.field_bin_size
+      layer = p4_field.BlockerLayer(dict(
+          (obj, p4_field.rasterize(obj.position, obj.radius, expansion, bin_size))
+          for obj in self.all_objects if obj.static))
+      self.static_layers[expansion] = layer
+    return layer
+
+  def obstacle_window(self, expansion, box):
+    """blocked cells of the inclusive cell range box counting obstacles
+    only, since units path into nests and resources"""
+    i_lo, i_hi, j_lo, j_hi = box
+    bin_size = self.field_bin_size
+    footprints = {}
+    for obj in self.objects_by_class[Obstacle]:
+      (x, y), reach = obj.position, obj.radius + expansion
+      if (x + reach)/bin_size >= i_lo - 1 and (x - reach)/bin_size <= i_hi + 1 and \
+         (y + reach)/bin_size >= j_lo - 1 and (y - reach)/bin_size <= j_hi + 1:
+        footprints[obj] = p4_field.rasterize(obj.position, obj.radius, expansion, bin_size)
+    return p4_field.BlockerLayer(footprints).window(i_lo, i_hi, j_lo, j_hi)
+
+  def hierarchy(self, expansion):
+    """cluster and entrance graph over the obstacles, built once per
+    expansion and kept up as obstacles come and go"""
+    hierarchy = self.hierarchies.get(expansion)
+    if hierarchy is None:
+      ni, nj = self.field_shape()
+      blocked = self.obstacle_window(expansion, (0, ni-1, 0, nj-1))
+      hierarchy = p4_hpa.Hierarchy(blocked, self.cluster_size)
+      self.hierarchies[expansion] = hierarchy
+    return hierarchy
+
+  def build_hierarchies(self):
+    """build the hierarchies go_to will want, one for each size of moving
+    object, so the first trips don't wait on them"""
+    for radius in sorted(set(obj.radius for obj in self.all_objects if not obj.static)):
+      self.hierarchy(radius)
+
+  def obstacle_changed(self, obj):
+    """redo the clusters of each hierarchy that obj's footprint covers"""
+    if not obj.position:
+      return
+    bin_size = self.field_bin_size
+    for expansion, hierarchy in self.hierarchies.items():
+      ii, jj = p4_field.rasterize(obj.position, obj.radius, expansion, bin_size)
+      if len(ii):
+        box = (int(ii.min()), int(ii.max()), int(jj.min()), int(jj.max()))
+        hierarchy.update(self.obstacle_window(expansion, box), box)
+
+  def plan_path(self, source, target, expansion=0):
+    """waypoints from source to target across the obstacles, ending at
+    target itself. when target can't be reached they pass the reachable
+    cell closest to it, leaving a last short leg to push through; None if
+    source is walled in"""
+    bin_size = self.field_bin_size
+    hierarchy = self.hierarchy(expansion)
+    goal = (int(round(target[0]/bin_size)), int(round(target[1]/bin_size)))
+    cells = hierarchy.plan(
+        (int(round(source[0]/bin_size)), int(round(source[1]/bin_size))), goal)
+    if cells is None:
+      return None
+    if cells[-1] == hierarchy.open_cell(goal):
+      cells = cells[:-1]
+    else:
+      self.path_fallbacks += 1
+      if self.profiler: self.profiler.count('path_fallbacks')
+    waypoints = []
+    last = cells[0]
+    # entrances come in facing pairs a cell apart; one of each will do
+    for cell in cells[1:]:
+      if abs(cell[0] - last[0]) + abs(cell[1] - last[1]) > 1:
+        waypoints.append((cell[0]*bin_size, cell[1]*bin_size))
+        last = cell
+    waypoints.append(target)
+    return waypoints
+
+  def leg_field(self, source, waypoint, expansion=0):
+    """distance field toward waypoint over just the clusters holding source
+    and waypoint (plus a cell around them) with static blockers only;
+    outside it the field's default leads straight at the waypoint"""
+    self.field_builds += 1
+    if self.profiler: self.profiler.count('field_builds')
+    bin_size = self.field_bin_size
+    hierarchy = self.hierarchy(expansion)
+    ni, nj = hierarchy.shape
+    boxes = [hierarchy.bounds(hierarchy.cluster(
+                 (int(p[0]/bin_size), int(p[1]/bin_size)))) for p in (source, waypoint)]
+    window = (max(0, min(b[0] for b in boxes) - 1), min(ni-1, max(b[1] for b in boxes) + 1),
+              max(0, min(b[2] for b in boxes) - 1), min(nj-1, max(b[3] for b in boxes) + 1))
+    start = (int(waypoint[0]/bin_size), int(waypoint[1]/bin_size))
+    return p4_field.solve(
+        p4_field.WindowGrid(window, start, self.static_layer(expansion)),
+        bin_size,
+        waypoint)
 
   def build_distance_field(self, target, blockers=[], expansion=0):
-    """build a low-resolution distance map and return a function that uses
-    bilinear interpolation to look up continuous positions"""
-
-    bin_size = 20
+    """build a low-resolution distance map and return a DistanceField that
+    uses bilinear interpolation to look up continuous positions"""
 
-    obstacles = {} # (i,j) -> bool 
-
-    # paint no-obstacles over the map
-    for i in range(self.width/bin_size):
-      for j in range(self.height/bin_size):
-        obstacles[(i,j)] = False
+    self.field_builds += 1
+    if self.profiler: self.profiler.count('field_builds')
+    bin_size = self.field_bin_size
 
     # rasterize collision space of each object
-    for obj in blockers:
-      i_lo = int((obj.position[0] - obj.radius)/bin_size - 1)
-      i_hi = int((obj.position[0] + obj.radius)/bin_size + 1)
-      j_lo = int((obj.position[1] - obj.radius)/bin_size - 1)
-      j_hi = int((obj.position[1] + obj.radius)/bin_size + 1)
-      for i in range(i_lo, i_hi+1):
-        for j in range(j_lo, j_hi+1):
-          x, y = i*bin_size, j*bin_size
-          dx = obj.position[0]-x
-          dy = obj.position[1]-y
-          dist = math.sqrt(dx*dx+dy*dy)
-          if dist < obj.radius + expansion:
-            obstacles[(i,j)] = True
-
-    # dijkstra's algorithm to build distance map
-    dist = {}
+    footprints = [p4_field.rasterize(obj.position, obj.radius, expansion, bin_size)
+                  for obj in blockers]
+
     start = (int(target[0]/bin_size), int(target[1]/bin_size))
-    dist[start] = 0
-    queue = [(0,start)]
-    while queue:
-      d, c = heapq.heappop(queue)
-      for di, dj in [(-1,0),(1,0),(0,-1),(0,1)]:
-        next_c = (c[0] + di, c[1] + dj)
-        if next_c in obstacles:
-
-          if not obstacles[next_c]:
-            cost = 1
-          else:
-            cost = 1e6
-          next_d = d + cost
-          if next_c not in dist or next_d < dist[next_c]:
-            dist[next_c] = d
-            heapq.heappush(queue, (next_d, next_c))
-
-    def lookup(position): # bilinear interpolation
-      x,y = position
-      alpha = float(x % bin_size)/bin_size
-      beta = float(y % bin_size)/bin_size
-      i, j = int(x / bin_size), int(y / bin_size)
-      dx = x - self.width/2
-      dy = y - self.height/2
-      default = 2*math.sqrt(dx*dx+dy*dy)
-      a = dist.get((i,j),default)
-      b = dist.get((i+1,j),default)
-      c = dist.get((i,j+1),default)
-      d = dist.get((i+1,j+1),default)
-      ab = (1-alpha)*a + alpha*b
-      cd = (1-alpha)*c + alpha*d
-      abcd = (1-beta)*ab + beta*cd
-      return abcd
-
-    return lookup
+    return p4_field.build(
+        self.field_shape(),
+        footprints,
+        start,
+        bin_size,
+        (self.width/2, self.height/2),
+        self.field_outside)
+
+  def distance_field(self, target, expansion=0, exclude=()):
+    """like build_distance_field with every registered object except those
+    in exclude as a blocker, but reusing the static blocker raster and
+    sharing finished fields through the field cache"""
+
+    key, job = self.field_job(target, expansion, exclude)
+    field = self.field_cache.get(key)
+    if field is None:
+      self.field_builds += 1
+      if self.profiler: self.profiler.count('field_builds')
+      build, args = job()
+      field = build(*args)
+      self.field_cache.put(key, field)
+    return field
+
+  def field_job(self, target, expansion, exclude):
+    """cache key of the field toward target, and a function returning the
+    (picklable) function and arguments that build it"""
+    start, key = self.field_key(target, expansion, exclude)
+
+    def job():
+      grid = self.field_grid(start, expansion, exclude)
+      center = (self.width/2, self.height/2)
+      return p4_field.solve, (grid, self.field_bin_size, center, self.field_outside)
+    return key, job
+
+  def request_field(self, obj, target, expansion, exclude, offset=None):
+    """distance_field for go_to: with a path_latency, a field that isn't
+    cached is left to come due later and None is returned"""
+    if self.path_latency is None:
+      return self.distance_field(target, expansion, exclude)
+    key, job = self.field_job(target, expansion, exclude)
+    field = self.field_cache.get(key)
+    if field is not None:
+      return field
+    request = self.path_requests.get(key)
+    if request is None:
+      self.field_builds += 1
+      if self.profiler: self.profiler.count('field_builds')
+      build, args = job()
+      due = self.tick + self.path_latency
+      if self.path_pool:
+        request = PathRequest(key, due, job=self.path_pool.apply_async(build, args))
+      else:
+        request = PathRequest(key, due, field=build(*args))
+      self.path_requests[key] = request
+    request.followers.append((obj, offset, self.footprint(obj, expansion, exclude)))
+    obj.path_request = request
+    return None
+
+  def deliver_paths(self):
+    """start units on the fields that came due, in the order they were
+    asked for, waiting for the workers if they are running late"""
+    for key, request in list(self.path_requests.items()):
+      if request.due > self.tick:
+        continue
+      del self.path_requests[key]
+      field = request.wait()
+      self.field_cache.put(key, field)
+      for obj, offset, home in request.followers:
+        # units that were given something else to do meanwhile are left be
+        if obj.path_request is request:
+          obj.path_request = None
+          obj.controller = FieldFollower(field, offset, home)
+
+  def start_path_workers(self, processes=None, latency=10):
+    """build go_to fields in worker processes, handing them out latency
+    ticks after they were asked for"""
+    self.stop_path_workers()
+    self.path_latency = latency
+    self.path_pool = multiprocessing.Pool(processes)
+
+  def stop_path_workers(self):
+    """go back to building fields in go_to, after handing out the pending
+    ones as if they had come due"""
+    if self.path_pool:
+      for request in self.path_requests.values():
+        request.wait()
+      self.path_pool.close()
+      self.path_pool.join()
+      self.path_pool = None
+    self.path_latency = None
+    for request in self.path_requests.values():
+      request.due = self.tick
+    self.deliver_paths()
+
+  def field_key(self, target, expansion, exclude):
+    """start cell and field cache key for a search toward target; exclude
+    is what the field must not treat as blocking (the object being
+    headed for, a group on the move), never the unit asking, so that
+    units going the same way share the field"""
+    self.check_dynamic_blockers()
+    bin_size = self.field_bin_size
+    start = (int(target[0]/bin_size), int(target[1]/bin_size))
+    exclude = frozenset(exclude)
+    return start, (start, expansion, self.blocker_version, exclude)
+
+  def field_shape(self):
+    """(columns, rows) of distance field cells the map holds"""
+    return int(self.width/self.field_bin_size), int(self.height/self.field_bin_size)
+
+  def field_grid(self, start, expansion, exclude):
+    """search grid over the static and moving blocker rasters"""
+    footprints = [footprint for obj, footprint in self.dynamic_layer(expansion).footprints.items()
+                  if obj not in exclude]
+    return p4_field.Grid(
+        self.field_shape(),
+        footprints,
+        start,
+        self.static_layer(expansion),
+        exclude)
 
   def update(self, dt):
     """update the world and all registered GameObject instances"""
 
-    self.time += dt
+    profiler = self.profiler
+    if profiler: started = lap = profiler.clock()
 
-    # update all objects
-    for obj in self.all_objects:
-      obj.update(dt)
-
-    # let brains handle collision reactions
-    def handle_collision(a,b):
-      if a.brain: a.brain.handle_event('collide',{'what': str(b.__class__.__name__), 'who': b})
-      if b.brain: b.brain.handle_event('collide',{'what': str(a.__class__.__name__), 'who': a})
+    self.time += dt
+    self.tick += 1
+    self.updating = True
 
-    # collide within species
-    for animal in [Slug,Mantis]:
-      self.eject_colliders(self.objects_by_class[animal],self.objects_by_class[animal],randomize=True)
+    if self.path_requests:
+      self.deliver_paths()
+      if profiler: lap = profiler.lap('paths', lap)
 
-    # collide across species
-    self.eject_colliders(self.objects_by_class[Mantis],self.objects_by_class[Slug],randomize=True,handler=handle_collision)
+    # wake up objects whose alarms went off
+    self.dispatch_alarms()
+    if profiler: lap = profiler.lap('timers', lap)
 
-    # collide animals with minerals without handlers
-    for animal in [Slug,Mantis]:
-      for mineral in [Obstacle]:
-        self.eject_colliders(self.objects_by_class[animal],self.objects_by_class[mineral])
+    # update all objects
+    if self.store is not None:
+      self.update_controllers(dt)
+    else:
+      for obj in self.all_objects:
+        obj.update(dt)
+    if profiler: lap = profiler.lap('controllers', lap)
 
-    # collide animals with minerals with handlers
-    for animal in [Slug,Mantis]:
-      for mineral in [Nest,Resource]:
-        self.eject_colliders(self.objects_by_class[animal],self.objects_by_class[mineral],handler=handle_collision)
+    self.resolve_collisions()
+    if profiler: lap = profiler.lap('collisions', lap)
 
-    # clean up objects with negative amount values
+    # clean up objects with negative amount values, along with everything
+    # else destroyed during the tick
     for obj in self.all_objects:
       if obj.amount < 0:
         obj.destroy()
       elif obj.amount > 1:
         obj.amount = 1
-
-
-  def eject_colliders(self, firsts, seconds, randomize=False, handler=None):
-    
-    def eject(o1, o2):
-      if o1 != o2:
-        dx = o1.position[0] - o2.position[0]
-        dy = o1.position[1] - o2.position[1]
-        dist = math.sqrt(dx*dx+dy*dy)
-        if dist < o1.radius + o2.radius:
-          extra = dist - (o1.radius + o2.radius)
-          fraction = extra / dist
-          if handler: handler(o1,o2) # let colliders know they collided!
+    self.updating = False
+    doomed, self.doomed = self.doomed, p4_registry.Registry()
+    for obj in doomed:
+      self.unregister(obj)
+    if profiler:
+      profiler.lap('cleanup', lap)
+      profiler.end_tick(started)
+    if self.telemetry:
+      self.telemetry.end_tick(self)
+
+  def update_controllers(self, dt):
+    """step every controlled object, one update_batch call per controller
+    type; types go in the order their first object was registered, and
+    objects within a batch all see positions from before the batch"""
+    batches = {}
+    order = []
+    controlled = []
+    for obj in self.all_objects:
+      if obj.controller:
+        controlled.append(obj)
+        clazz = obj.controller.__class__
+        if clazz in batches:
+          batches[clazz].append(obj)
+        else:
+          batches[clazz] = [obj]
+          order.append(clazz)
+    self.store.gather(controlled)
+    for clazz in order:
+      clazz.update_batch(batches[clazz], dt, self.store)
+
+  def schedule_alarm(self, obj, deadline):
+    """queue a timer event for obj; entries that no longer match the
+    object's deadline are skipped when they come up"""
+    heapq.heappush(self.alarms, (deadline, next(self.alarm_sequence), obj))
+
+  def dispatch_alarms(self):
+    """send timer events to objects whose alarms went off, earliest first
+    (ties in the order the alarms were set); brain classes with
+    handle_events_batch get theirs together afterwards"""
+    alarms = self.alarms
+    batches = collections.OrderedDict() # brain class -> ([obj], [[event]])
+    while alarms and alarms[0][0] < self.time:
+      deadline, sequence, obj = heapq.heappop(alarms)
+      if obj.timer_deadline == deadline and obj in self.all_objects:
+        obj.timer_deadline = None
+        if obj.brain:
+          if hasattr(obj.brain.__class__, 'handle_events_batch'):
+            bodies, events = batches.setdefault(obj.brain.__class__, ([], []))
+            bodies.append(obj)
+            events.append([('timer', None)])
+          else:
+            self.send(obj, 'timer', None)
+    for clazz, (bodies, events) in batches.items():
+      self.send_batch(clazz, bodies, events)
+
+  def enable_profiling(self, **options):
+    """start collecting per-phase tick metrics (see TickProfiler)"""
+    self.profiler = p4_profile.TickProfiler(**options)
+    return self.profiler
+
+  def disable_profiling(self):
+    self.profiler = None
+
+  def enable_telemetry(self, sink, every=100, **options):
+    """sample the world every `every` ticks into a p4_telemetry sink (or
+    a file, see p4_telemetry.open_sink) from a background writer"""
+    self.disable_telemetry()
+    if isinstance(sink, basestring):
+      sink = p4_telemetry.open_sink(sink)
+    self.telemetry = p4_telemetry.Telemetry(sink, every, **options)
+    self.telemetry.last_field_builds = self.field_builds
+    self.telemetry.last_nearest_searches = self.nearest_searches
+    return self.telemetry
+
+  def disable_telemetry(self):
+    """stop sampling, after writing out what was sampled"""
+    if self.telemetry:
+      self.telemetry.close()
+      self.telemetry = None
+
+  def send(self, obj, message, details):
+    """deliver an event to an object's brain"""
+    if hasattr(obj.brain.__class__, 'handle_events_batch'):
+      self.send_batch(obj.brain.__class__, [obj], [[(message, details)]])
+    elif self.profiler:
+      started = self.profiler.clock()
+      obj.brain.handle_event(message, details)
+      self.profiler.lap('brains', started)
+    else:
+      obj.brain.handle_event(message, details)
+
+  def send_events(self, obj, events):
+    """deliver a tick's worth of (message, details) to an object's brain,
+    in one call if the brain has handle_events"""
+    brain = obj.brain
+    if self.profiler: started = self.profiler.clock()
+    if hasattr(brain, 'handle_events'):
+      brain.handle_events(events)
+    else:
+      for message, details in events:
+        brain.handle_event(message, details)
+    if self.profiler: self.profiler.lap('brains', started)
+
+  def send_batch(self, clazz, bodies, events):
+    """deliver events to every body in one call to a brain class's
+    handle_events_batch(bodies, events), where events[k] is the list of
+    (message, details) for bodies[k]. brain classes that define it get all
+    their events this way; the rest get them one brain at a time."""
+    if self.profiler:
+      started = self.profiler.clock()
+      clazz.handle_events_batch(bodies, events)
+      self.profiler.lap('brains', started)
+      self.profiler.count('brain_batches')
+    else:
+      clazz.handle_events_batch(bodies, events)
+
+  def queue_event(self, obj, message, details):
+    if obj.brain:
+      self.events.setdefault(obj, []).append((message, details))
+
+  def deliver_events(self):
+    events, self.events = self.events, collections.OrderedDict()
+    batches = collections.OrderedDict() # brain class -> ([obj], [[event]])
+    for obj, batch in events.items():
+      if hasattr(obj.brain.__class__, 'handle_events_batch'):
+        bodies, queued = batches.setdefault(obj.brain.__class__, ([], []))
+        bodies.append(obj)
+        queued.append(batch)
+      else:
+        self.send_events(obj, batch)
+    for clazz, (bodies, queued) in batches.items():
+      self.send_batch(clazz, bodies, queued)
+
+  def handle_collision(self, a, b):
+    """let brains handle collision reactions"""
+    if a.brain: self.send(a, 'collide',{'what': str(b.__class__.__name__), 'who': b})
+    if b.brain: self.send(b, 'collide',{'what': str(a.__class__.__name__), 'who': a})
+
+  def note_contact(self, a, b):
+    """collision handler for 'contacts' mode: remember the pair for
+    update_contacts"""
+    self.touching[(a, b) if a.entity_id < b.entity_id else (b, a)] = True
+
+  def update_contacts(self):
+    """turn this tick's touching pairs into enter/stay/exit events"""
+    previous, touching = self.contacts, self.touching
+    contacts = collections.OrderedDict()
+    stay = self.contact_stay_ticks
+    for pair, began in previous.items():
+      a, b = pair
+      if pair in touching:
+        contacts[pair] = began
+        if stay and (self.tick - began) % stay == 0:
+          self.queue_contact('collide_stay', a, b)
+      else:
+        # objects that left the world don't hear about it
+        self.queue_contact('collide_exit', a, b, registered_only=True)
+    for pair in touching:
+      if pair not in previous:
+        contacts[pair] = self.tick
+        self.queue_contact('collide_enter', *pair)
+    self.contacts = contacts
+    self.touching = collections.OrderedDict()
+
+  def queue_contact(self, message, a, b, registered_only=False):
+    for obj, other in ((a, b), (b, a)):
+      if registered_only and obj not in self.all_objects:
+        continue
+      self.queue_event(obj, message, Contact(other.__class__.__name__, other))
+
+  def resolve_collisions(self):
+    """one broadphase pass over all objects, settling each overlapping pair
+    by the collision rule for its (first class, second class)"""
+
+    # first class -> (second classes, second class -> collide arguments)
+    plan = collections.defaultdict(lambda: ([], {}))
+    for (first, second), rule in sorted(self.collision_rules.items(),
+                                        key=lambda item: (item[0][0].__name__, item[0][1].__name__)):
+      handler = None
+      if rule.notify:
+        handler = self.handle_collision if self.collision_events == 'collide' else self.note_contact
+      plan[first][0].append(second)
+      plan[first][1][second] = (rule.eject, rule.randomize, handler)
+
+    query = self.broadphase.query
+    collide = self.collide
+    self.broadphase.refresh(self.all_objects)
+    for o1 in self.all_objects:
+      if o1.__class__ in plan:
+        classes, rules = plan[o1.__class__]
+        for o2 in query(o1, classes):
+          eject, randomize, handler = rules[o2.__class__]
+          collide(o1, o2, eject, randomize, handler)
+
+    if self.collision_events == 'contacts':
+      self.update_contacts()
+      self.deliver_events()
+
+  def collide(self, o1, o2, eject=True, randomize=False, handler=None):
+    """if o1 and o2 overlap, tell the handler and push one of them out"""
+    if o1 != o2:
+      dx = o1.position[0] - o2.position[0]
+      dy = o1.position[1] - o2.position[1]
+      dist = math.sqrt(dx*dx+dy*dy)
+      if dist < o1.radius + o2.radius:
+        extra = dist - (o1.radius + o2.radius)
+        fraction = extra / dist
+        if handler: handler(o1,o2) # let colliders know they collided!
+        if eject:
           if randomize and random.random() < 0.5:
             o2.position = (o2.position[0] + fraction*dx, o2.position[1] + fraction*dy)
           else:
             o1.position = (o1.position[0] - fraction*dx, o1.position[1] - fraction*dy)
 
-    def sorted_with_bounds(objects):
-      return sorted([(o.position[0]-o.radius, 'add', o) for o in objects] +
-                    [(o.position[0]+o.radius, 'remove', o) for o in objects])
-
-    active_firsts = {}
-    active_seconds = {}
-
-    firsts_with_bounds = sorted_with_bounds(firsts)
-    seconds_with_bounds = sorted_with_bounds(seconds)
-
-    while firsts_with_bounds and seconds_with_bounds:
-
-      o1_key, o1_cmd, o1 = firsts_with_bounds[0]
-      o2_key, o2_cmd, o2 = seconds_with_bounds[0]
-
-      if o1_key < o2_key:
-        firsts_with_bounds.pop(0)
-        if o1_cmd is 'add':
-          active_firsts[o1] = True
-          for o2 in active_seconds:
-            eject(o1,o2)
-        else:
-          del active_firsts[o1]
-      else:
-        seconds_with_bounds.pop(0)
-        if o2_cmd is 'add':
-          active_seconds[o2] = True
-          for o1 in active_firsts:
-            eject(o1,o2)
-        else:
-          del active_seconds[o2]
+  def eject_colliders(self, firsts, seconds, randomize=False, handler=None):
+    """push apart overlapping pairs of registered objects, one from firsts
+    and one from seconds"""
+
+    # candidate pairs come from the persistent broadphase, binned by where
+    # everyone stood when the sweep started
+    self.broadphase.refresh(firsts)
+    self.broadphase.refresh(seconds)
+    classes = list(collections.OrderedDict((o.__class__, True) for o in seconds))
+    seconds = set(seconds)
+    for o1 in firsts:
+      for o2 in self.broadphase.query(o1, classes):
+        if o2 in seconds:
+          self.collide(o1, o2, True, randomize, handler)
 
   def populate(self, specification, brain_classes):
     """create an interesting randomized level design"""
@@ -277,30 +820,105 @@ class World:
     for i in range(10): # jiggle the world around for a while so it looks pretty
       self.eject_colliders(self.all_objects,self.all_objects,randomize=True)
 
-  def find_nearest(self, searcher, clazz=None, where=None):
+    # static objects were just jiggled into their final places
+    self.blockers_changed(static=True)
+    self.hierarchies.clear()
+    if self.pathfinder == 'hpa':
+      self.build_hierarchies()
+
+  def find_nearest(self, searcher, clazz=None, where=None, max_distance=None):
     """find the nearest object of the given class and property according to
     navigable distance"""
 
-    field = self.build_distance_field(
-        searcher.position,
-        self.all_objects,
-        -searcher.radius)
+    obj, distance = self.search_nearest(searcher, clazz, where, max_distance)
+    if obj is None:
+      raise ValueError("nothing to find")
+    return obj
+
+  def search_nearest(self, searcher, clazz=None, where=None, max_distance=None):
+    """like find_nearest, but return (object, navigable distance in pixels),
+    or (None, None) if nothing qualifies within max_distance; the search
+    stops as soon as the winner is certain"""
 
     if clazz:
       candidates = self.objects_by_class[clazz]
     else:
       candidates = self.all_objects
+    candidates = filter(where,candidates)
+    if not candidates:
+      return None, None
+
+    if self.profiler: self.profiler.count('find_nearest')
+
+    bin_size = self.field_bin_size
+    center = (self.width/2, self.height/2)
+    limit = float('inf') if max_distance is None else float(max_distance)/bin_size
+    start, key = self.field_key(searcher.position, -searcher.radius, ())
+
+    field = self.field_cache.get(key)
+    if field is not None:
+      index, value = None, None
+      for i, obj in enumerate(candidates):
+        v = field(obj.position)
+        if v <= limit and (index is None or v < value):
+          index, value = i, v
+    else:
+      self.nearest_searches += 1
+      if self.profiler: self.profiler.count('nearest_searches')
+      grid = self.field_grid(start, -searcher.radius, ())
+      index, value = p4_field.nearest(grid, [obj.position for obj in candidates], bin_size, center,
+                                      limit, self.field_outside)
 
-    return min(filter(where,candidates),key=lambda obj: field(obj.position))
-
+    if index is None:
+      return None, None
+    return candidates[index], value*bin_size
 
   def issue_selection_order(self, order):
     """apply user's order (a key or right-click location) to the selected
     objects"""
 
-    for obj in self.selection:
-      if obj.brain:
-        obj.brain.handle_event('order',order)
+    members = sorted((obj for obj in self.selection if obj.brain),
+                     key=lambda obj: obj.entity_id)
+    if self.recorder:
+      self.recorder.order(self.tick, order, [obj.entity_id for obj in members])
+    if isinstance(order, tuple) and len(members) > 1:
+      # the whole group paths over one field that none of them block
+      self.group_order = GroupOrder(order, frozenset(members),
+                                    self.formation_offsets(members))
+    try:
+      for obj in members:
+        self.send(obj, 'order', order)
+    finally:
+      self.group_order = None
+
+  def go_to_together(self, members, target):
+    """send members to target the way a group move order would, over one
+    field that none of them block"""
+    outer = self.group_order
+    if len(members) > 1:
+      self.group_order = GroupOrder(target, frozenset(members),
+                                    self.formation_offsets(members))
+    try:
+      for obj in members:
+        obj.go_to(target)
+    finally:
+      self.group_order = outer
+
+  def formation_offsets(self, members):
+    """obj -> offset from the group's goal, laying members out on a square
+    grid in the order of their current positions (empty when
+    formation_spacing is off)"""
+    spacing = self.formation_spacing
+    if not spacing:
+      return {}
+    members = sorted(members, key=lambda obj: (obj.position[1], obj.position[0]))
+    columns = int(math.ceil(math.sqrt(len(members))))
+    rows = int(math.ceil(len(members) / float(columns)))
+    offsets = {}
+    for k, obj in enumerate(members):
+      row, column = divmod(k, columns)
+      offsets[obj] = ((column - (columns-1)/2.0)*spacing, (row - (rows-1)/2.0)*spacing)
+    return offsets
 
   def make_selection(self):
     """build selection from the set of units contained in the sel_a-to-sel_b
@@ -326,6 +944,13 @@ class Controller(object):
   def update(self, obj, dt):
     pass
 
+  @classmethod
+  def update_batch(cls, objs, dt, store):
+    """update objects that all have a controller of this class"""
+    for obj in objs:
+      obj.controller.update(obj, dt)
+    store.sync(objs)
+
 class ObjectFollower(Controller):
   """behavior of following another object via direct approach"""
 
@@ -339,25 +964,172 @@ class ObjectFollower(Controller):
     obj.position = (obj.position[0] + dt*obj.speed*dx/mag,
                     obj.position[1] + dt*obj.speed*dy/mag)
 
+  @classmethod
+  def update_batch(cls, objs, dt, store):
+    slots = store.slots(objs)
+    # targets are read as they are, having moved already if their batch
+    # came earlier
+    goals = [obj.controller.target.position for obj in objs]
+    ready = store.placed[slots] & numpy.fromiter(itertools.imap(bool, goals), dtype=bool, count=len(objs))
+    unready = [objs[k] for k in numpy.flatnonzero(~ready)]
+    for obj in unready:
+      obj.controller.update(obj, dt)
+    store.sync(unready)
+    tx, ty = p4_store.coordinates(goals)
+    slots = slots[ready]
+    x, y = store.x[slots], store.y[slots]
+    dx = tx[ready] - x
+    dy = ty[ready] - y
+    mag = numpy.sqrt(dx*dx+dy*dy)
+    moving = mag != 0 # already on top of the target
+    slots, x, y, dx, dy, mag = [a[moving] for a in (slots, x, y, dx, dy, mag)]
+    speed = store.speed[slots]
+    store.move(slots, x + dt*speed*dx/mag, y + dt*speed*dy/mag)
+
 class FieldFollower(Controller):
-  """behavior of descending a given distance field"""
+  """behavior of descending a given distance field
+
+  steps use the field's precomputed per-cell slopes (its flow field), and
+  only fall back to four interpolated lookups near cell edges and blocked
+  cells
+
+  an offset makes the follower descend the field shifted by that much, so
+  units sharing one field settle around its goal instead of on it (the
+  shifted field is only approximately right around obstacles)
 
-  def __init__(self, field):
+  fields are shared by everyone headed the same way, so the follower's own
+  footprint is a blocker in them too. home is that footprint, (x, y,
+  reach); until the follower is out of it, it heads for the lowest point
+  just around it instead of descending the walled-off cells it stands in"""
+
+  batch_minimum = 8 # followers of one field worth stepping with numpy
+
+  def __init__(self, field, offset=None, home=None):
     self.field = field
+    self.offset = offset
+    self.home = home
+    self.exit = None # where to leave home for
 
   def update(self, obj, dt):
     x, y = obj.position
+    if self.offset:
+      x, y = x - self.offset[0], y - self.offset[1]
     eps = 0.1
-    gx = self.field((x+eps,y)) - self.field((x-eps,y))
-    gy = self.field((x,y+eps)) - self.field((x,y-eps))
+    if self.home:
+      hx, hy, reach = self.home
+      if (x-hx)*(x-hx) + (y-hy)*(y-hy) < reach*reach:
+        if self.exit is None:
+          self.exit = self.way_out()
+        gradient = (x - self.exit[0], y - self.exit[1])
+      else:
+        self.home = self.exit = None
+        gradient = self.field.gradient((x,y), eps)
+    else:
+      gradient = self.field.gradient((x,y), eps)
+    if gradient:
+      gx, gy = gradient
+    else:
+      gx = self.field((x+eps,y)) - self.field((x-eps,y))
+      gy = self.field((x,y+eps)) - self.field((x,y-eps))
     mag = math.sqrt(gx*gx+gy*gy)
     if mag:
       obj.position = (obj.position[0] - dt*obj.speed*gx/mag,
                       obj.position[1] - dt*obj.speed*gy/mag)
 
+  def way_out(self):
+    """the lowest of some points on a ring just outside home"""
+    hx, hy, reach = self.home
+    r = reach + self.field.bin_size
+    ring = [(hx + r*math.cos(k*math.pi/8), hy + r*math.sin(k*math.pi/8)) for k in range(16)]
+    return min(ring, key=self.field)
+
+  @classmethod
+  def update_batch(cls, objs, dt, store):
+    by_field = {}
+    fields = [] # in the order they first come up
+    homebound = []
+    for obj in objs:
+      controller = obj.controller
+      if controller.home:
+        homebound.append(obj)
+      elif id(controller.field) in by_field:
+        by_field[id(controller.field)].append(obj)
+      else:
+        by_field[id(controller.field)] = [obj]
+        fields.append(id(controller.field))
+    for obj in homebound:
+      obj.controller.update(obj, dt)
+    store.sync(homebound)
+    eps = 0.1
+    for followers in [by_field[k] for k in fields]:
+      if len(followers) < cls.batch_minimum:
+        # numpy setup costs more than it saves for a few followers
+        Controller.update_batch.im_func(cls, followers, dt, store)
+        continue
+      field = followers[0].controller.field
+      slots = store.slots(followers)
+      placed = store.placed[slots]
+      for k in numpy.flatnonzero(~placed):
+        followers[k].controller.update(followers[k], dt)
+      store.sync([followers[k] for k in numpy.flatnonzero(~placed)])
+      slots = slots[placed]
+      x, y = store.x[slots], store.y[slots]
+      fx, fy = x, y # where the field is sampled
+      offsets = [obj.controller.offset or (0, 0)
+                 for obj, ok in zip(followers, placed) if ok]
+      if any(offset != (0, 0) for offset in offsets):
+        offsets = numpy.array(offsets, dtype=float)
+        fx, fy = x - offsets[:,0], y - offsets[:,1]
+      gx, gy, flowing = field.gradient_many(fx, fy, eps)
+      rest = numpy.flatnonzero(~flowing)
+      if len(rest):
+        rx, ry = fx[rest], fy[rest]
+        n = len(rest)
+        probes = numpy.empty((4*n, 2))
+        probes[:n,0], probes[:n,1] = rx+eps, ry
+        probes[n:2*n,0], probes[n:2*n,1] = rx-eps, ry
+        probes[2*n:3*n,0], probes[2*n:3*n,1] = rx, ry+eps
+        probes[3*n:,0], probes[3*n:,1] = rx, ry-eps
+        values = field.lookup_many(probes)
+        gx[rest] = values[:n] - values[n:2*n]
+        gy[rest] = values[2*n:3*n] - values[3*n:]
+      mag = numpy.sqrt(gx*gx+gy*gy)
+      moving = mag != 0
+      slots, x, y, gx, gy, mag = [a[moving] for a in (slots, x, y, gx, gy, mag)]
+      speed = store.speed[slots]
+      store.move(slots, x - dt*speed*gx/mag, y - dt*speed*gy/mag)
+
+class WaypointFollower(Controller):
+  """behavior of following World.plan_path waypoints, descending a small
+  World.leg_field toward each one in turn and moving on to the next once
+  within a cell of it"""
+
+  def __init__(self, world, waypoints, expansion):
+    self.world = world
+    self.waypoints = list(waypoints)
+    self.expansion = expansion
+    self.leg = None # FieldFollower toward waypoints[0]
+
+  def update(self, obj, dt):
+    if obj.position is None:
+      return
+    bin_size = self.world.field_bin_size
+    while len(self.waypoints) > 1:
+      dx = obj.position[0] - self.waypoints[0][0]
+      dy = obj.position[1] - self.waypoints[0][1]
+      if dx*dx + dy*dy >= bin_size*bin_size:
+        break
+      self.waypoints.pop(0)
+      self.leg = None
+    if self.leg is None:
+      self.leg = FieldFollower(self.world.leg_field(obj.position, self.waypoints[0], self.expansion))
+    self.leg.update(obj, dt)
+
 class GameObject(object):
   """base class for objects managed by a World"""
 
+  static = False # never moves once the world is populated
+
   def __init__(self, world):
     self.world = world
     self.radius = 10
@@ -367,68 +1139,77 @@ class GameObject(object):
     self.brain = None
     self.amount = 1 # a generic value that is visualized in the graphics
     self.timer_deadline = None
+    self.entity_id = None # assigned when first registered
+    self.path_request = None # PathRequest go_to is waiting on
+    self.group_order = None # GroupOrder of the group move this unit is on
 
   def __repr__(self):
     return '<%s %d>' % (str(self.__class__.__name__), id(self))
 
-  def draw(self, canvas):
-    """draw a generic object to the screen using it's position, radius, color, and amount"""
-    if self.position:
-      sa = math.sqrt(self.amount)
-      canvas.create_oval(
-          self.position[0]-self.radius*sa,
-          self.position[1]-self.radius*sa,
-          self.position[0]+self.radius*sa,
-          self.position[1]+self.radius*sa,
-          outline='',
-          fill=self.color)
-      canvas.create_oval(
-          self.position[0]-self.radius,
-          self.position[1]-self.radius,
-          self.position[0]+self.radius,
-          self.position[1]+self.radius,
-          outline='black',
-          fill='')
-
-
   def update(self, dt):
     """handle simulation-rate updates by delegating to controller"""
-    if self.timer_deadline is not None:
-      if self.timer_deadline < self.world.time:
-        self.timer_deadline = None
-        if self.brain:
-          self.brain.handle_event('timer', None)
-
     if self.controller:
       self.controller.update(self, dt)
 
   def go_to(self, target):
-    blockers = [obj for obj in self.world.all_objects if obj is not target and obj is not self]
-    position = target.position if isinstance(target, GameObject) else target
-    field = self.world.build_distance_field(position, blockers, self.radius)
-    field_follower = FieldFollower(field)
-    self.controller = field_follower
+    self.path_request = None
+    if isinstance(target, GameObject):
+      position, exclude = target.position, (target,)
+    else:
+      position, exclude = target, ()
+    # a unit keeps to its group's field for as long as it heads for the
+    # group's target, however often it paths again
+    group = self.world.group_order
+    if not (group and self in group.members and position == group.target):
+      group = self.group_order
+    if group and self in group.members and position == group.target:
+      self.group_order = group
+    else:
+      self.group_order = group = None
+    if self.world.pathfinder == 'hpa':
+      waypoints = self.world.plan_path(self.position, position, self.radius)
+      if waypoints:
+        self.controller = WaypointFollower(self.world, waypoints, self.radius)
+        return
+    offset = None
+    if group:
+      exclude = group.members
+      offset = group.offsets.get(self)
+    field = self.world.request_field(self, position, self.radius, exclude, offset)
+    if field is not None:
+      home = self.world.footprint(self, self.radius, exclude)
+      field_follower = FieldFollower(field, offset, home)
+      self.controller = field_follower
+
+  def find_nearest(self, classname, where=None, max_distance=None):
+    clazz = eval(classname)
+    return self.world.find_nearest(self, clazz, where, max_distance)
 
-  def find_nearest(self, classname):
+  def search_nearest(self, classname, where=None, max_distance=None):
     clazz = eval(classname)
-    return self.world.find_nearest(self, clazz)
+    return self.world.search_nearest(self, clazz, where, max_distance)
 
   def follow(self, target):
+    self.path_request = None
     self.controller = ObjectFollower(target)
 
   def stop(self):
+    self.path_request = None
     self.controller = None
 
   def destroy(self):
-    self.world.unregister(self)
+    self.world.destroy(self)
 
   def set_alarm(self, dt):
     when = self.world.time + dt
     if self.timer_deadline is None or when < self.timer_deadline:
       self.timer_deadline = when
+      self.world.schedule_alarm(self, when)
 
 class Nest(GameObject):
   """home-base for Team Slug"""
+  static = True
+
   def __init__(self, world):
     super(Nest, self).__init__(world)
     self.radius = 100
@@ -437,6 +1218,8 @@ class Nest(GameObject):
   
 class Obstacle(GameObject):
   """an impassable rocky obstacle"""
+  static = True
+
   def __init__(self, world):
     super(Obstacle, self).__init__(world)
     self.radius = 25
@@ -444,6 +1227,8 @@ class Obstacle(GameObject):
 
 class Resource(GameObject):
   """a tasty clump of resources to be consumed"""
+  static = True
+
   def __init__(self, world):
     super(Resource, self).__init__(world)
     self.radius = 25
@@ -471,65 +1256,111 @@ class Mantis(GameObject):
     self.radius = 5
     self.color = '#484'
 
-import p4_brains
+CollisionRule = collections.namedtuple('CollisionRule', 'eject randomize notify')
+
+# (first class, second class) -> how World.update settles their overlaps:
+# whether to push them apart, whether either one may be pushed (otherwise
+# always the first), and whether their brains hear about it
+COLLISION_RULES = {
+  (Slug, Slug):         CollisionRule(eject=True, randomize=True,  notify=False),
+  (Mantis, Mantis):     CollisionRule(eject=True, randomize=True,  notify=False),
+  (Mantis, Slug):       CollisionRule(eject=True, randomize=True,  notify=True),
+  (Slug, Obstacle):     CollisionRule(eject=True, randomize=False, notify=False),
+  (Mantis, Obstacle):   CollisionRule(eject=True, randomize=False, notify=False),
+  (Slug, Nest):         CollisionRule(eject=True, randomize=False, notify=True),
+  (Slug, Resource):     CollisionRule(eject=True, randomize=False, notify=True),
+  (Mantis, Nest):       CollisionRule(eject=True, randomize=False, notify=True),
+  (Mantis, Resource):   CollisionRule(eject=True, randomize=False, notify=True),
+}
 
 CANVAS_WIDTH = 800
 CANVAS_HEIGHT = 600
 
-master = Tkinter.Tk()
-master.title("Tears of the Mantis: Legends of Xenocide")
+SIMULATION_TICK_DELAY_MS = 10.0
+GRAPHICS_TICK_DELAY_MS = 30.0
 
-world = World(CANVAS_WIDTH, CANVAS_WIDTH)
-world.populate(p4_brains.world_specification, p4_brains.brain_classes)
+def load_brains(name='p4_brains'):
+  """import a module shaped like p4_brains (world_specification and
+  brain_classes) by name"""
+  return importlib.import_module(name)
 
-canvas = Tkinter.Canvas(master, width=CANVAS_WIDTH, height=CANVAS_HEIGHT) 
-canvas.pack()
+def make_world(brains, width=CANVAS_WIDTH, height=CANVAS_WIDTH):
+  """build a World populated from a brains module"""
+  world = World(width, height)
+  world.populate(brains.world_specification, brains.brain_classes)
+  return world
 
-SIMULATION_TICK_DELAY_MS = 10.0
-GRAPHICS_TICK_DELAY_MS = 30.0
+def main(world, step=SIMULATION_TICK_DELAY_MS/1000.0, speed=1.0, max_steps=5, interpolate=True):
+  """show a world in a Tk window and run it in fixed steps of simulated
+  time, speed times faster than real time (see p4_clock.FixedStep)"""
 
-def global_simulation_tick():
-  world.update(SIMULATION_TICK_DELAY_MS/1000.0)
-  master.after(int(SIMULATION_TICK_DELAY_MS), global_simulation_tick)
+  master = Tkinter.Tk()
+  master.title("Tears of the Mantis: Legends of Xenocide")
 
-def global_graphics_tick():
-  world.draw(canvas)
-  master.after(int(GRAPHICS_TICK_DELAY_MS), global_graphics_tick)
+  canvas = Tkinter.Canvas(master, width=CANVAS_WIDTH, height=CANVAS_HEIGHT) 
+  canvas.pack()
 
-master.after_idle(global_simulation_tick)
-master.after_idle(global_graphics_tick)
+  clock = p4_clock.FixedStep(world, step, max_steps, speed, interpolate)
 
-def left_button_down(event):
-  world.sel_a = (event.x, event.y)
-  if world.selection:
-    world.clear_selection()
+  def global_simulation_tick():
+    clock.frame()
+    master.after(int(SIMULATION_TICK_DELAY_MS), global_simulation_tick)
 
-def left_button_double(event):
-  world.sel_a = (0,0)
-  world.sel_b = (world.width, world.height)
-  world.make_selection()
+  def global_graphics_tick():
+    world.draw(canvas, clock)
+    master.after(int(GRAPHICS_TICK_DELAY_MS), global_graphics_tick)
 
-def left_button_move(event):
-  if world.sel_a:
-    world.sel_b = (event.x, event.y)
+  master.after_idle(global_simulation_tick)
+  master.after_idle(global_graphics_tick)
 
-def left_button_up(event):
-  if world.sel_a:
-    world.sel_b = (event.x, event.y)
+  def left_button_down(event):
+    world.sel_a = (event.x, event.y)
+    if world.selection:
+      world.clear_selection()
+
+  def left_button_double(event):
+    world.sel_a = (0,0)
+    world.sel_b = (world.width, world.height)
     world.make_selection()
 
-def right_button_down(event):
-  world.issue_selection_order((event.x, event.y))
+  def left_button_move(event):
+    if world.sel_a:
+      world.sel_b = (event.x, event.y)
+
+  def left_button_up(event):
+    if world.sel_a:
+      world.sel_b = (event.x, event.y)
+      world.make_selection()
+
+  def right_button_down(event):
+    world.issue_selection_order((event.x, event.y))
+
+  def key_down(event):
+    world.issue_selection_order(event.char)
+
+  master.bind('<ButtonPress-1>', left_button_down)
+  master.bind('<Double-Button-1>', left_button_double)
+  master.bind('<B1-Motion>', left_button_move)
+  master.bind('<ButtonRelease-1>', left_button_up)
+  master.bind('<ButtonPress-2>', right_button_down)
+  master.bind('<Key>', key_down)
+  master.bind('<Escape>', lambda event: master.quit())
+
+  def toggle_profiler(event):
+    if world.profiler:
+      world.disable_profiling()
+    else:
+      world.enable_profiling(on_screen=True)
+  master.bind('<F2>', toggle_profiler)
 
-def key_down(event):
-  world.issue_selection_order(event.char)
+  def change_speed(factor):
+    clock.speed = min(max(clock.speed*factor, 0.125), 8.0)
+  master.bind('<Prior>', lambda event: change_speed(2.0))
+  master.bind('<Next>', lambda event: change_speed(0.5))
 
-master.bind('<ButtonPress-1>', left_button_down)
-master.bind('<Double-Button-1>', left_button_double)
-master.bind('<B1-Motion>', left_button_move)
-master.bind('<ButtonRelease-1>', left_button_up)
-master.bind('<ButtonPress-2>', right_button_down)
-master.bind('<Key>', key_down)
-master.bind('<Escape>', lambda event: master.quit())
+  master.mainloop()
 
-master.mainloop()
+if __name__ == '__main__':
+  # usage: python p4_game.py [brains_module]
+  logging.basicConfig(format='%(name)s: %(message)s')
+  main(make_world(load_brains(*sys.argv[1:2])))
@@ -0,0 +1,30 @@
+# run a world without any GUI, as fast as the CPU allows
+#
+# usage: python p4_headless.py [brains_module] [ticks] [report_every]
+
+import sys
+import time
+import p4_game
+
+DEFAULT_TICKS = 1000
+
+def run(world, ticks, dt=p4_game.SIMULATION_TICK_DELAY_MS/1000.0):
+  """advance a world by some fixed-size ticks and return ticks per second"""
+  start = time.time()
+  for i in range(ticks):
+    world.update(dt)
+  elapsed = time.time() - start
+  return ticks / elapsed if elapsed else float('inf')
+
+def main(argv):
+  brains = p4_game.load_brains(*argv[1:2])
+  ticks = int(argv[2]) if len(argv) > 2 else DEFAULT_TICKS
+  world = p4_game.make_world(brains)
+  if len(argv) > 3:
+    # rolling per-phase summary every so many ticks
+    world.enable_profiling(report_every=int(argv[3]), stream=sys.stderr)
+  rate = run(world, ticks)
+  print >>sys.stderr, "%d ticks, %.1f ticks/s" % (ticks, rate)
+
+if __name__ == '__main__':
+  main(sys.argv)
@@ -0,0 +1,250 @@
+import collections
+import heapq
+import itertools
+
+# neighbors of a cell, in the order the field search sweeps them
+STEPS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+
+class Hierarchy(object):
+  """HPA*-style abstraction of a map's blocked cells for long trips
+
+  the map is cut into square clusters of cluster_size cells. every open
+  stretch of the border between two clusters gets one entrance, a pair of
+  facing cells at its middle, and the entrances of each cluster are linked
+  by the length of the shortest path between them inside it. a query only
+  searches the two clusters at its ends plus this entrance graph, so its
+  cost follows the number of clusters crossed rather than the map's area.
+
+  blocked cells are impassable here (the field search merely makes them
+  expensive), and path lengths are counted in 4-connected cell steps.
+  update() redoes just the clusters a change of blocked cells touches."""
+
+  def __init__(self, blocked, cluster_size=10):
+    self.shape = blocked.shape
+    self.cluster_size = cluster_size
+    self.free = [[not b for b in row] for row in blocked.tolist()]
+    self.entrances = collections.defaultdict(list) # cluster -> [cell]
+    self.edges = collections.defaultdict(dict) # cell -> {cell: length}
+    self.find_entrances()
+    for cluster in self.entrances.keys():
+      self.link(cluster)
+
+  def cluster(self, cell):
+    return (cell[0] // self.cluster_size, cell[1] // self.cluster_size)
+
+  def neighbors(self, cluster):
+    ni, nj = self.shape
+    s = self.cluster_size
+    for di, dj in STEPS:
+      other = (cluster[0] + di, cluster[1] + dj)
+      if 0 <= other[0]*s < ni and 0 <= other[1]*s < nj:
+        yield other
+
+  def link(self, cluster):
+    """link each entrance of cluster to the others reachable inside it"""
+    cells = self.entrances[cluster]
+    for cell in cells:
+      edges = self.edges[cell]
+      for other in [o for o in edges if self.cluster(o) == cluster]:
+        del edges[other]
+      reached = self.search(cell)
+      for other in cells:
+        if other != cell and other in reached:
+          edges[other] = reached[other]
+
+  def update(self, blocked, box):
+    """take the blocked cells in the inclusive range box = (i_lo, i_hi,
+    j_lo, j_hi) from the raster blocked of that range, and redo the
+    entrances and links of the clusters around them"""
+    ni, nj = self.shape
+    i_lo, i_hi, j_lo, j_hi = box
+    for i, row in zip(range(i_lo, i_hi+1), blocked.tolist()):
+      if 0 <= i < ni:
+        for j, b in zip(range(j_lo, j_hi+1), row):
+          if 0 <= j < nj:
+            self.free[i][j] = not b
+    lo = self.cluster((max(i_lo, 0), max(j_lo, 0)))
+    hi = self.cluster((min(i_hi, ni-1), min(j_hi, nj-1)))
+    changed = set((a, b) for a in range(lo[0], hi[0]+1) for b in range(lo[1], hi[1]+1))
+    borders = set()
+    for cluster in changed:
+      for other in self.neighbors(cluster):
+        borders.add(min((cluster, other), (other, cluster)))
+    for first, second in sorted(borders):
+      self.drop_entrances(first, second)
+      self.add_entrances(self.border(first, second))
+    relink = set(changed)
+    for cluster in changed:
+      relink.update(self.neighbors(cluster))
+    for cluster in sorted(relink):
+      self.entrances[cluster].sort()
+      self.link(cluster)
+
+  def border(self, first, second):
+    """facing cell pairs along the border of two clusters, second being
+    below or right of first"""
+    i_lo, i_hi, j_lo, j_hi = self.bounds(first)
+    if second[0] > first[0]:
+      return [((i_hi, j), (i_hi+1, j)) for j in range(j_lo, j_hi+1)]
+    return [((i, j_hi), (i, j_hi+1)) for i in range(i_lo, i_hi+1)]
+
+  def drop_entrances(self, first, second):
+    """forget the entrances between two clusters"""
+    for a in list(self.entrances[first]):
+      for b in [b for b in self.edges[a] if self.cluster(b) == second]:
+        del self.edges[a][b]
+        del self.edges[b][a]
+        self.entrances[first].remove(a)
+        self.entrances[second].remove(b)
+        for cell, cluster in ((a, first), (b, second)):
+          if cell not in self.entrances[cluster]:
+            edges = self.edges[cell]
+            for other in [o for o in edges if self.cluster(o) == cluster]:
+              del edges[other]
+
+  def bounds(self, cluster):
+    """inclusive cell range (i_lo, i_hi, j_lo, j_hi) of a cluster"""
+    s = self.cluster_size
+    ni, nj = self.shape
+    return (cluster[0]*s, min(ni, (cluster[0]+1)*s) - 1,
+            cluster[1]*s, min(nj, (cluster[1]+1)*s) - 1)
+
+  def find_entrances(self):
+    s = self.cluster_size
+    ni, nj = self.shape
+    for i in range(s - 1, ni - 1, s): # clusters above and below
+      self.add_entrances([((i, j), (i+1, j)) for j in range(nj)])
+    for j in range(s - 1, nj - 1, s): # clusters left and right
+      self.add_entrances([((i, j), (i, j+1)) for i in range(ni)])
+    for cells in self.entrances.values():
+      cells.sort()
+
+  def add_entrances(self, border):
+    """entrances along one straight border, given as facing cell pairs"""
+    free = self.free
+    segment = []
+    for a, b in border:
+      is_open = free[a[0]][a[1]] and free[b[0]][b[1]]
+      # segments end where the border is blocked or crosses into new clusters
+      if segment and (not is_open or self.cluster(a) != self.cluster(segment[0][0])):
+        self.add_entrance(segment)
+        segment = []
+      if is_open:
+        segment.append((a, b))
+    if segment:
+      self.add_entrance(segment)
+
+  def add_entrance(self, segment):
+    a, b = segment[len(segment)//2]
+    self.entrances[self.cluster(a)].append(a)
+    self.entrances[self.cluster(b)].append(b)
+    self.edges[a][b] = 1
+    self.edges[b][a] = 1
+
+  def search(self, start):
+    """breadth-first path lengths from start to the free cells of its cluster"""
+    i_lo, i_hi, j_lo, j_hi = self.bounds(self.cluster(start))
+    free = self.free
+    reached = {start: 0}
+    frontier = [start]
+    d = 0
+    while frontier:
+      d += 1
+      next_frontier = []
+      for i, j in frontier:
+        for di, dj in STEPS:
+          n = (i+di, j+dj)
+          if (i_lo <= n[0] <= i_hi and j_lo <= n[1] <= j_hi and
+              free[n[0]][n[1]] and n not in reached):
+            reached[n] = d
+            next_frontier.append(n)
+      frontier = next_frontier
+    return reached
+
+  def open_cell(self, cell):
+    """the free cell nearest to cell (clamped onto the map), or None if
+    there is none within a cluster's width of it"""
+    ni, nj = self.shape
+    i = min(max(cell[0], 0), ni-1)
+    j = min(max(cell[1], 0), nj-1)
+    for r in range(self.cluster_size + 1):
+      ring = [(i+di, j+dj) for di in range(-r, r+1) for dj in range(-r, r+1)
+              if max(abs(di), abs(dj)) == r]
+      ring.sort(key=lambda c: (abs(c[0]-i) + abs(c[1]-j), c))
+      for a, b in ring:
+        if 0 <= a < ni and 0 <= b < nj and self.free[a][b]:
+          return (a, b)
+    return None
+
+  def plan(self, start, goal):
+    """cells to pass through on the way from start to goal: start, the
+    entrances crossed and goal, after both ends were moved to the nearest
+    free cell. if the goal can't be reached the cells lead to the
+    reachable one closest to it instead; None if start is walled in"""
+    ni, nj = self.shape
+    wanted = (min(max(goal[0], 0), ni-1), min(max(goal[1], 0), nj-1))
+    start = self.open_cell(start)
+    goal = self.open_cell(goal)
+    if goal is not None:
+      wanted = goal
+    if start is None:
+      return None
+    within = self.search(start)
+    if goal in within:
+      return [start, goal]
+    from_start = dict((e, within[e]) for e in self.entrances[self.cluster(start)]
+                      if e in within)
+    to_goal = {}
+    if goal is not None:
+      from_goal = self.search(goal)
+      to_goal = dict((e, from_goal[e]) for e in self.entrances[self.cluster(goal)]
+                     if e in from_goal)
+
+    def estimate(cell):
+      return abs(cell[0] - wanted[0]) + abs(cell[1] - wanted[1])
+
+    def closest(cells):
+      return min(cells, key=lambda cell: (estimate(cell), cell))
+
+    sequence = itertools.count() # ties go to the earlier push
+    best = {start: 0}
+    parent = {start: None}
+    heap = [(estimate(start), next(sequence), start)]
+    done = set()
+    nearest = start # closest to the goal of the cells reached so far
+    while heap:
+      f, k, cell = heapq.heappop(heap)
+      if cell == goal:
+        path = []
+        while cell is not None:
+          path.append(cell)
+          cell = parent[cell]
+        return path[::-1]
+      if cell in done:
+        continue
+      done.add(cell)
+      if estimate(cell) < estimate(nearest):
+        nearest = cell
+      links = sorted(self.edges.get(cell, {}).items())
+      if cell == start:
+        links += sorted(from_start.items())
+      if cell in to_goal:
+        links.append((goal, to_goal[cell]))
+      for other, length in links:
+        d = best[cell] + length
+        if d < best.get(other, d + 1):
+          best[other] = d
+          parent[other] = cell
+          heapq.heappush(heap, (d + estimate(other), next(sequence), other))
+
+    # unreachable: finish inside the cluster of the closest cell reached
+    if nearest == start:
+      return [start, closest(within)]
+    path = []
+    cell = nearest
+    while cell is not None:
+      path.append(cell)
+      cell = parent[cell]
+    path.reverse()
+    path.append(closest(self.search(nearest)))
+    return path
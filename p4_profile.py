@@ -0,0 +1,67 @@
+import collections
+import sys
+import time
+
+# phases World.update reports, in the order they run; brain event handling
+# happens inside timers and collisions and is also timed on its own
+PHASES = ['paths', 'timers', 'controllers', 'collisions', 'brains', 'cleanup']
+
+class TickProfiler(object):
+  """per-phase timings and event counts for World.update, kept as running
+  totals and as a rolling window of recent ticks"""
+
+  clock = staticmethod(time.time)
+
+  def __init__(self, window=100, report_every=None, stream=None, on_screen=False):
+    self.recent = collections.deque(maxlen=window)
+    self.report_every = report_every
+    self.stream = stream
+    self.on_screen = on_screen
+    self.ticks = 0
+    self.total_seconds = collections.defaultdict(float)
+    self.total_counts = collections.defaultdict(int)
+    self.seconds = collections.defaultdict(float)
+    self.counts = collections.defaultdict(int)
+
+  def lap(self, phase, since):
+    """charge the time since a clock() reading to a phase; returns now"""
+    now = self.clock()
+    self.seconds[phase] += now - since
+    return now
+
+  def count(self, name, n=1):
+    self.counts[name] += n
+
+  def end_tick(self, started):
+    """close the books on a tick that began at the given clock() reading"""
+    self.seconds['tick'] = self.clock() - started
+    for phase, seconds in self.seconds.items():
+      self.total_seconds[phase] += seconds
+    for name, n in self.counts.items():
+      self.total_counts[name] += n
+    self.recent.append((self.seconds, self.counts))
+    self.seconds = collections.defaultdict(float)
+    self.counts = collections.defaultdict(int)
+    self.ticks += 1
+    if self.report_every and self.ticks % self.report_every == 0:
+      print >>(self.stream or sys.stdout), self.summary()
+
+  def averages(self):
+    """(ms per tick by phase, count per tick by name) over the window"""
+    n = len(self.recent) or 1
+    ms = collections.defaultdict(float)
+    per_tick = collections.defaultdict(float)
+    for seconds, counts in self.recent:
+      for phase, s in seconds.items():
+        ms[phase] += 1000*s/n
+      for name, c in counts.items():
+        per_tick[name] += float(c)/n
+    return dict(ms), dict(per_tick)
+
+  def summary(self):
+    """one line describing the recent window"""
+    ms, per_tick = self.averages()
+    parts = ['tick %.2fms' % ms.get('tick', 0)]
+    parts += ['%s %.2f' % (phase, ms.get(phase, 0)) for phase in PHASES]
+    parts += ['%s %.1f' % (name, n) for name, n in sorted(per_tick.items())]
+    return ' '.join(parts)
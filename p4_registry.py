@@ -0,0 +1,74 @@
+import itertools
+
+class Registry(object):
+  """objects in the order they were added, with O(1) add, remove and
+  membership tests
+
+  removing an object leaves a hole in its slot, and the holes are squeezed
+  out once they make up half of the slots. an iteration goes over the slots
+  there were when it started and skips whatever was removed since, so
+  objects can come and go while it runs; ones added meanwhile turn up in
+  the next pass."""
+
+  COMPACT_AT = 16 # fewer holes than this are never worth a pass
+
+  def __init__(self, objects=()):
+    self.slots = []
+    self.index = {} # obj -> slot
+    self.holes = 0
+    for obj in objects:
+      self.add(obj)
+
+  def add(self, obj):
+    """append obj unless it's already here; returns whether it was added"""
+    if obj in self.index:
+      return False
+    self.index[obj] = len(self.slots)
+    self.slots.append(obj)
+    return True
+
+  def remove(self, obj):
+    """take obj out if it's here; returns whether it was"""
+    slot = self.index.pop(obj, None)
+    if slot is None:
+      return False
+    self.slots[slot] = None
+    self.holes += 1
+    if self.holes >= self.COMPACT_AT and 2*self.holes >= len(self.slots):
+      self.compact()
+    return True
+
+  def compact(self):
+    # a new list, so iterations still running keep the slots they started on
+    self.slots = [obj for obj in self.slots if obj is not None]
+    self.index = dict((obj, k) for k, obj in enumerate(self.slots))
+    self.holes = 0
+
+  def __contains__(self, obj):
+    return obj in self.index
+
+  def __len__(self):
+    return len(self.index)
+
+  def __nonzero__(self):
+    return bool(self.index)
+
+  def __iter__(self):
+    slots = self.slots
+    for obj in itertools.islice(slots, len(slots)):
+      if obj is not None and obj in self.index:
+        yield obj
+
+  def __getitem__(self, k):
+    """position k in iteration order (or a slice of them, as a list); this
+    walks the slots, so it is not O(1)"""
+    if isinstance(k, slice):
+      return list(self)[k]
+    if k < 0:
+      k += len(self)
+    if not 0 <= k < len(self):
+      raise IndexError("registry index out of range")
+    return next(itertools.islice(self, k, None))
+
+  def __repr__(self):
+    return 'Registry(%r)' % list(self)
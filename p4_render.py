@@ -0,0 +1,148 @@
+import math
+import time
+
+class CanvasRenderer(object):
+  """retained-mode drawing of a World onto a Tk canvas
+
+  each object gets its canvas items the first time it is drawn and after
+  that they are only moved (with canvas.coords) when its position, radius
+  or amount changed. static objects never move, so only their amount is
+  checked. forget() drops an object's items and is called by
+  World.unregister. given a p4_clock.FixedStep, moving objects are drawn
+  where it places them between steps."""
+
+  def __init__(self, canvas):
+    self.canvas = canvas
+    self.backdrop = None
+    self.items = {} # obj -> [fill oval, outline oval, drawn state]
+    self.highlights = {} # selected obj -> rectangle
+    self.selection_box = None
+    self.overlay = None
+    self.frame_ms = 0.0 # smoothed time spent in draw()
+    self.frames = 0
+
+  def draw(self, world, clock=None):
+    started = time.time()
+    canvas = self.canvas
+    if self.backdrop is None:
+      self.backdrop = canvas.create_rectangle(0, 0, world.width, world.height,
+                                              fill='#eba', outline='')
+
+    created = False
+    items = self.items
+    for obj in world.all_objects:
+      entry = items.get(obj)
+      if entry is None:
+        items[obj] = self.create(obj)
+        created = True
+      elif obj.static:
+        if entry[2][2] != obj.amount:
+          self.move(obj, entry)
+      elif clock is not None:
+        position = clock.position(obj)
+        if entry[2] != (position, obj.radius, obj.amount, obj.color):
+          self.move(obj, entry, position)
+      elif entry[2] != (obj.position, obj.radius, obj.amount, obj.color):
+        self.move(obj, entry)
+
+    created = self.draw_selection(world) or created
+    self.draw_overlay(world, clock)
+    if created:
+      # newer objects must not cover highlights and text
+      canvas.tag_raise('highlight')
+      canvas.tag_raise('overlay')
+
+    elapsed = 1000*(time.time() - started)
+    self.frame_ms = elapsed if not self.frames else 0.9*self.frame_ms + 0.1*elapsed
+    self.frames += 1
+
+  def create(self, obj):
+    canvas = self.canvas
+    entry = [canvas.create_oval(0, 0, 0, 0, outline='', fill=obj.color),
+             canvas.create_oval(0, 0, 0, 0, outline='black', fill=''),
+             None]
+    self.move(obj, entry)
+    return entry
+
+  def move(self, obj, entry, position=None):
+    """bring an object's items in line with its current state, drawing it
+    at position if given"""
+    canvas = self.canvas
+    if position is None:
+      position = obj.position
+    state = (position, obj.radius, obj.amount, obj.color)
+    drawn = entry[2]
+    if not position:
+      if not drawn or drawn[0]:
+        canvas.itemconfigure(entry[0], state='hidden')
+        canvas.itemconfigure(entry[1], state='hidden')
+    else:
+      if drawn and not drawn[0]:
+        canvas.itemconfigure(entry[0], state='normal')
+        canvas.itemconfigure(entry[1], state='normal')
+      x, y = position
+      r = obj.radius
+      ra = r*math.sqrt(obj.amount)
+      canvas.coords(entry[0], x-ra, y-ra, x+ra, y+ra)
+      canvas.coords(entry[1], x-r, y-r, x+r, y+r)
+      highlight = self.highlights.get(obj)
+      if highlight is not None:
+        canvas.coords(highlight, x-r-1, y-r-1, x+r+1, y+r+1)
+    if drawn and drawn[3] != obj.color:
+      canvas.itemconfigure(entry[0], fill=obj.color)
+    entry[2] = state
+
+  def forget(self, obj):
+    """delete the canvas items of an object that left the world"""
+    entry = self.items.pop(obj, None)
+    if entry:
+      self.canvas.delete(entry[0], entry[1])
+    highlight = self.highlights.pop(obj, None)
+    if highlight is not None:
+      self.canvas.delete(highlight)
+
+  def draw_selection(self, world):
+    """keep one highlight rectangle per selected object, plus the partial
+    selection box; returns whether any item was created"""
+    canvas = self.canvas
+    created = False
+    for obj in [obj for obj in self.highlights if obj not in world.selection]:
+      canvas.delete(self.highlights.pop(obj))
+    for obj in world.selection:
+      if obj not in self.highlights and obj.position:
+        x, y = obj.position
+        r = obj.radius
+        self.highlights[obj] = canvas.create_rectangle(
+            x-r-1, y-r-1, x+r+1, y+r+1,
+            outline='green', fill='', width=2.0, tags='highlight')
+        created = True
+
+    if world.sel_a and world.sel_b:
+      box = (min(world.sel_a[0], world.sel_b[0]), min(world.sel_a[1], world.sel_b[1]),
+             max(world.sel_a[0], world.sel_b[0]), max(world.sel_a[1], world.sel_b[1]))
+      if self.selection_box is None:
+        self.selection_box = canvas.create_rectangle(
+            box, outline='green', fill='', width=2.0, tags='highlight')
+        created = True
+      else:
+        canvas.coords(self.selection_box, box)
+    elif self.selection_box is not None:
+      canvas.delete(self.selection_box)
+      self.selection_box = None
+    return created
+
+  def draw_overlay(self, world, clock=None):
+    """profiler summary and frame time in the corner while on_screen"""
+    canvas = self.canvas
+    if world.profiler and world.profiler.on_screen:
+      text = 'frame %.2fms %s' % (self.frame_ms, world.profiler.summary())
+      if clock is not None:
+        text += ' ' + clock.summary()
+      if self.overlay is None:
+        self.overlay = canvas.create_text(4, 4, anchor='nw', text=text,
+                                          font=('Courier', 9), tags='overlay')
+      else:
+        canvas.itemconfigure(self.overlay, text=text)
+    elif self.overlay is not None:
+      canvas.delete(self.overlay)
+      self.overlay = None
@@ -0,0 +1,153 @@
+# record a GUI session, or replay one headless as fast as the CPU allows
+#
+# usage: python p4_replay.py record session.ndjson [brains_module] [--path-latency TICKS]
+#        python p4_replay.py play session.ndjson [--until TICK] [--gui]
+#                                [--telemetry samples.ndjson|.csv] [--telemetry-every TICKS]
+#
+# a recording is newline-delimited JSON: a header line with everything
+# needed to rebuild the starting world (brains module, size, seeded
+# specification, tick length), one [tick, order, selected entity ids] line
+# per order, and an {"end": tick} line when the session closes. worldgen
+# seeds the only random number generator in play, so the rest of the
+# session follows from these.
+
+import argparse
+import json
+import random
+import sys
+import time
+import p4_game
+
+class Recorder(object):
+  """World.recorder that streams orders to a file as they are issued"""
+
+  def __init__(self, stream, header):
+    self.stream = stream
+    self.write(header)
+
+  def write(self, record):
+    self.stream.write(json.dumps(record, separators=(',', ':')) + '\n')
+    self.stream.flush() # a crashed session should still replay
+
+  def order(self, tick, order, ids):
+    self.write([tick, order, ids])
+
+  def close(self, tick):
+    self.write({'end': tick})
+    self.stream.close()
+
+def start_world(header):
+  """the world a recording starts from"""
+  brains = p4_game.load_brains(header['brains'])
+  world = p4_game.World(header['width'], header['height'])
+  world.populate(header['specification'], brains.brain_classes)
+  # fields come due on the same ticks whether or not workers build them
+  world.path_latency = header.get('path_latency')
+  return world
+
+def record(path, brains_name='p4_brains', width=p4_game.CANVAS_WIDTH, height=p4_game.CANVAS_WIDTH,
+           path_latency=None):
+  """start a world whose orders are written to path, building go_to
+  fields in worker processes if given a path_latency"""
+  brains = p4_game.load_brains(brains_name)
+  specification = dict(brains.world_specification)
+  if 'worldgen_seed' not in specification:
+    # randomized worlds still need a seed to be replayable
+    specification['worldgen_seed'] = random.randrange(2**31)
+  header = {
+    'version': 1,
+    'brains': brains_name,
+    'width': width,
+    'height': height,
+    'specification': specification,
+    'dt': p4_game.SIMULATION_TICK_DELAY_MS/1000.0,
+    'path_latency': path_latency,
+  }
+  world = start_world(header)
+  if path_latency is not None:
+    world.start_path_workers(latency=path_latency)
+  world.recorder = Recorder(open(path, 'w'), header)
+  return world
+
+def load(path):
+  """(header, [(tick, order, ids)], end tick or None) from a recording"""
+  with open(path) as f:
+    header = json.loads(f.readline())
+    orders = []
+    end = None
+    for line in f:
+      record = json.loads(line)
+      if isinstance(record, dict):
+        end = record['end']
+      else:
+        tick, order, ids = record
+        if isinstance(order, list): # JSON has no tuples
+          order = tuple(order)
+        orders.append((tick, order, ids))
+  return header, orders, end
+
+def replay(header, orders, until, telemetry=None, telemetry_every=100):
+  """rebuild the recorded world and run it to tick `until`, issuing each
+  order at the tick it was given, and sampling it into the telemetry file
+  if there is one; returns the world"""
+  world = start_world(header)
+  if telemetry:
+    world.enable_telemetry(telemetry, telemetry_every)
+  dt = header['dt']
+  pending = list(reversed(orders))
+  while world.tick < until:
+    while pending and pending[-1][0] <= world.tick:
+      tick, order, ids = pending.pop()
+      issue(world, order, ids)
+    world.update(dt)
+  # orders given right at the stopping point still belong to it
+  while pending and pending[-1][0] <= world.tick:
+    tick, order, ids = pending.pop()
+    issue(world, order, ids)
+  world.disable_telemetry()
+  return world
+
+def issue(world, order, ids):
+  members = [world.entity(i) for i in ids]
+  world.selection = dict((obj, True) for obj in members if obj is not None)
+  world.issue_selection_order(order)
+
+def main(argv):
+  parser = argparse.ArgumentParser(description='record and replay sessions')
+  commands = parser.add_subparsers(dest='command')
+  record_parser = commands.add_parser('record')
+  record_parser.add_argument('path')
+  record_parser.add_argument('brains', nargs='?', default='p4_brains')
+  record_parser.add_argument('--path-latency', type=int,
+                             help='build go_to fields in worker processes, due this many ticks later')
+  play_parser = commands.add_parser('play')
+  play_parser.add_argument('path')
+  play_parser.add_argument('--until', type=int, help='stop at this tick (default: end of session)')
+  play_parser.add_argument('--gui', action='store_true', help='open the GUI where the replay stops')
+  play_parser.add_argument('--telemetry', help='stream world samples to this .ndjson or .csv file')
+  play_parser.add_argument('--telemetry-every', type=int, default=100, help='ticks between samples')
+  args = parser.parse_args(argv[1:])
+
+  if args.command == 'record':
+    world = record(args.path, args.brains, path_latency=args.path_latency)
+    try:
+      p4_game.main(world)
+    finally:
+      world.recorder.close(world.tick)
+      world.stop_path_workers()
+    return
+
+  header, orders, end = load(args.path)
+  until = args.until
+  if until is None:
+    until = end if end is not None else max([0] + [tick for tick, order, ids in orders])
+  start = time.time()
+  world = replay(header, orders, until, args.telemetry, args.telemetry_every)
+  elapsed = time.time() - start
+  print >>sys.stderr, "replayed %d ticks, %d orders in %.2fs" % (
+      world.tick, len(orders), elapsed)
+  if args.gui:
+    p4_game.main(world)
+
+if __name__ == '__main__':
+  main(sys.argv)
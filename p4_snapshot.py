@@ -0,0 +1,169 @@
+import cPickle as pickle
+import itertools
+import random
+import zlib
+import p4_game
+from cStringIO import StringIO
+
+# snapshot layout: zlib over two pickles, a small header with what World()
+# needs and then the body. inside the body registered GameObjects and the
+# World itself are persistent references, so brains, controllers and the
+# broadphase can point at them freely.
+
+VERSION = 1
+
+def _intern_strings(brain, seen):
+  """brains compare states like `self.state is 'idle'`, which only holds
+  for interned strings, and unpickled strings are not"""
+  if id(brain) in seen or not hasattr(brain, '__dict__'):
+    return
+  seen.add(id(brain))
+  for name, value in brain.__dict__.items():
+    if type(value) is str:
+      brain.__dict__[name] = intern(value)
+    elif not isinstance(value, (p4_game.GameObject, type)):
+      _intern_strings(value, seen)
+
+def dumps(world, compress=True):
+  """serialize a world, its objects, their brains and controllers, pending
+  alarms and the random module's state"""
+  registered = world.all_objects
+
+  def persistent_id(obj):
+    if isinstance(obj, p4_game.GameObject) and obj in registered:
+      return (obj.entity_id, obj.__class__)
+    if obj is world:
+      return 'world'
+    return None
+
+  # the next id is only visible by taking it, so put it back afterwards
+  next_id = next(world.entity_ids)
+  world.entity_ids = itertools.count(next_id)
+
+  alarms = []
+  pending = set()
+  for deadline, sequence, obj in sorted(world.alarms):
+    if obj in registered and obj.timer_deadline == deadline and obj not in pending:
+      alarms.append((deadline, obj.entity_id))
+      pending.add(obj)
+
+  header = {
+    'version': VERSION,
+    'width': world.width,
+    'height': world.height,
+    'storage': 'arrays' if world.store is not None else None,
+  }
+  body = {
+    'time': world.time,
+    'tick': world.tick,
+    'next_id': next_id,
+    'field_bin_size': world.field_bin_size,
+    'field_outside': world.field_outside,
+    'formation_spacing': world.formation_spacing,
+    'pathfinder': world.pathfinder,
+    'path_latency': world.path_latency,
+    'path_requests': world.path_requests,
+    'cluster_size': world.cluster_size,
+    'collision_rules': world.collision_rules,
+    'collision_events': world.collision_events,
+    'contact_stay_ticks': world.contact_stay_ticks,
+    'contacts': world.contacts,
+    'blocker_tolerance': world.blocker_tolerance,
+    'dynamic_blockers': world.dynamic_blockers,
+    'dynamic_checked': world.dynamic_checked,
+    'objects': [(obj.entity_id, dict(obj.__dict__)) for obj in world.all_objects],
+    'selection': sorted(obj.entity_id for obj in world.selection),
+    'alarms': alarms,
+    'broadphase': world.broadphase,
+    'random': random.getstate(),
+  }
+  out = StringIO()
+  pickle.dump(header, out, 2)
+  pickler = pickle.Pickler(out, 2)
+  pickler.persistent_id = persistent_id
+  pickler.dump(body)
+  data = out.getvalue()
+  return zlib.compress(data) if compress else data
+
+def loads(data):
+  """rebuild a world from dumps() output; this also puts the random module
+  back in the state it had when the snapshot was taken"""
+  if data[:1] != '\x80': # pickles start with the protocol opcode
+    data = zlib.decompress(data)
+  stream = StringIO(data)
+  header = pickle.load(stream)
+  if header['version'] != VERSION:
+    raise ValueError("unsupported snapshot version: %r" % header['version'])
+  world = p4_game.World(header['width'], header['height'], header['storage'])
+
+  shells = {}
+  def persistent_load(pid):
+    if pid == 'world':
+      return world
+    entity_id, clazz = pid
+    if entity_id not in shells:
+      shells[entity_id] = clazz.__new__(clazz)
+    return shells[entity_id]
+
+  unpickler = pickle.Unpickler(stream)
+  unpickler.persistent_load = persistent_load
+  body = unpickler.load()
+
+  world.time = body['time']
+  world.tick = body['tick']
+  world.entity_ids = itertools.count(body['next_id'])
+  world.field_bin_size = body['field_bin_size']
+  world.field_outside = body['field_outside']
+  world.formation_spacing = body['formation_spacing']
+  world.pathfinder = body['pathfinder']
+  # pending fields were finished when the snapshot was taken, so they are
+  # handed out on time without the workers
+  world.path_latency = body['path_latency']
+  world.path_requests = body['path_requests']
+  world.cluster_size = body['cluster_size']
+  world.collision_rules = body['collision_rules']
+  world.collision_events = body['collision_events']
+  world.contact_stay_ticks = body['contact_stay_ticks']
+  # the saved grid keeps each cell's objects in their original order, which
+  # collision resolution depends on; register() leaves it alone
+  world.broadphase = body['broadphase']
+  seen = set()
+  for entity_id, state in body['objects']:
+    obj = shells[entity_id]
+    obj.__dict__.update(state)
+    _intern_strings(obj.brain, seen)
+    world.register(obj)
+
+  world.contacts = body['contacts']
+  # fields are built from the moving blockers as they were last taken,
+  # which registering everything again has just thrown away
+  world.blocker_tolerance = body['blocker_tolerance']
+  world.dynamic_blockers = body['dynamic_blockers']
+  world.dynamic_checked = body['dynamic_checked']
+  if world.pathfinder == 'hpa':
+    world.build_hierarchies()
+  world.alarms = []
+  for deadline, entity_id in body['alarms']:
+    world.schedule_alarm(shells[entity_id], deadline)
+  world.selection = dict((shells[i], True) for i in body['selection'])
+  random.setstate(body['random'])
+  return world
+
+def save(world, path):
+  with open(path, 'wb') as f:
+    f.write(dumps(world))
+
+def load(path):
+  with open(path, 'rb') as f:
+    return loads(f.read())
+
+class Checkpoint(object):
+  """in-memory snapshot to branch any number of what-if runs from; each
+  branch() is a fresh world with the random module rewound, so branches
+  only differ by what is done to them"""
+
+  def __init__(self, world):
+    self.data = dumps(world, compress=False)
+
+  def branch(self):
+    return loads(self.data)
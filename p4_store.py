@@ -0,0 +1,61 @@
+import itertools
+import numpy
+
+NOWHERE = (0.0, 0.0) # stands in for a missing position
+NAN = float('nan') # stands in for a missing speed
+
+def coordinates(positions):
+  """x and y arrays of a list of positions, NOWHERE for missing ones"""
+  xy = numpy.fromiter(itertools.chain.from_iterable([p or NOWHERE for p in positions]),
+                      dtype=float, count=2*len(positions))
+  return xy[0::2].copy(), xy[1::2].copy()
+
+class EntityStore(object):
+  """structure-of-arrays view of the controlled objects for batched
+  controllers: x, y and speed each sit in one float array indexed by slot,
+  a missing position is a cleared `placed` flag and a missing speed is NaN
+
+  objects keep their attributes as plain instance attributes, so nothing
+  outside the controller phase pays for the arrays. gather() takes them
+  into the arrays once a tick and move() writes new positions to both."""
+
+  def __init__(self):
+    self.objects = []
+    self.index = {} # obj -> slot
+    self.x = numpy.zeros(0)
+    self.y = numpy.zeros(0)
+    self.placed = numpy.zeros(0, dtype=bool)
+    self.speed = numpy.zeros(0)
+
+  def gather(self, objects):
+    """fill the arrays from objects, which get slots in their order"""
+    self.objects = objects = list(objects)
+    self.index = dict(itertools.izip(objects, itertools.count()))
+    positions = [obj.position for obj in objects]
+    self.placed = numpy.fromiter(itertools.imap(bool, positions), dtype=bool, count=len(objects))
+    self.x, self.y = coordinates(positions)
+    self.speed = numpy.array([obj.__dict__.get('speed', NAN) for obj in objects], dtype=float)
+
+  def slots(self, objects):
+    """slot index array for objects, with -1 for any not gathered"""
+    return numpy.fromiter(itertools.imap(self.index.get, objects, itertools.repeat(-1)),
+                          dtype=int, count=len(objects))
+
+  def sync(self, objects):
+    """take positions again for objects that were moved one at a time"""
+    for obj in objects:
+      slot = self.index.get(obj)
+      if slot is not None:
+        p = obj.position
+        self.placed[slot] = p is not None
+        if p is not None:
+          self.x[slot], self.y[slot] = p
+
+  def move(self, slots, x, y):
+    """write new positions for a batch of slots"""
+    self.x[slots] = x
+    self.y[slots] = y
+    self.placed[slots] = True
+    objects = self.objects
+    for slot, position in zip(slots.tolist(), zip(x.tolist(), y.tolist())):
+      objects[slot].position = position
@@ -0,0 +1,133 @@
+import csv
+import json
+import Queue
+import threading
+import time
+import slug_machine
+
+# classes sampled by name, so this module needn't import p4_game
+CLASSES = ['Nest', 'Obstacle', 'Resource', 'Slug', 'Mantis']
+AMOUNT_CLASSES = ['Nest', 'Resource', 'Slug', 'Mantis']
+STATES = sorted(state.name for state in vars(slug_machine).values()
+                if isinstance(state, slug_machine.SlugState))
+
+def sample(world, field_builds=0, nearest_searches=0):
+  """one telemetry record of a world's state, with the distance fields
+  built and the nearest-object searches run since the last one"""
+  population = dict((name, 0) for name in CLASSES)
+  amount = dict((name, 0.0) for name in AMOUNT_CLASSES)
+  states = dict((name, 0) for name in STATES)
+  for clazz, objects in world.objects_by_class.items():
+    name = clazz.__name__
+    population[name] = len(objects)
+    if name in amount:
+      amount[name] = sum(obj.amount for obj in objects)
+    for obj in objects:
+      machine = getattr(obj.brain, 'stateMachine', None)
+      if machine is not None:
+        state = machine.currentState.name
+        states[state] = states.get(state, 0) + 1
+  return {
+    'tick': world.tick,
+    'time': world.time,
+    'population': population,
+    'amount': amount,
+    'states': states,
+    'field_builds': field_builds,
+    'nearest_searches': nearest_searches,
+  }
+
+class NDJSONSink(object):
+  """one JSON object per line"""
+
+  def __init__(self, stream):
+    self.stream = stream
+
+  def write(self, record):
+    self.stream.write(json.dumps(record, separators=(',', ':'), sort_keys=True) + '\n')
+
+class CSVSink(object):
+  """one row per record with nested dicts flattened to 'population.Slug'
+  style columns; the columns are fixed by the first record"""
+
+  def __init__(self, stream):
+    self.stream = stream
+    self.writer = None
+
+  def write(self, record):
+    row = {}
+    for key, value in record.items():
+      if isinstance(value, dict):
+        for name, v in value.items():
+          row['%s.%s' % (key, name)] = v
+      else:
+        row[key] = value
+    if self.writer is None:
+      columns = ['tick', 'time'] + sorted(k for k in row if k not in ('tick', 'time'))
+      self.writer = csv.DictWriter(self.stream, columns, restval=0, extrasaction='ignore')
+      self.writer.writeheader()
+    self.writer.writerow(row)
+
+def open_sink(path):
+  """a CSVSink for .csv paths, NDJSONSink otherwise"""
+  stream = open(path, 'wb', 1 << 16)
+  if path.endswith('.csv'):
+    return CSVSink(stream)
+  return NDJSONSink(stream)
+
+class Telemetry(object):
+  """samples a World every `every` ticks and hands the samples to a
+  background thread that writes them to the sink
+
+  the simulation only ever puts a sample on a bounded queue: if the writer
+  falls that far behind, samples are dropped (and counted) rather than
+  making the tick wait. the sink's stream is flushed at most every
+  flush_seconds and when the writer is closed."""
+
+  def __init__(self, sink, every=100, backlog=1000, flush_seconds=1.0):
+    self.sink = sink
+    self.every = every
+    self.flush_seconds = flush_seconds
+    self.queue = Queue.Queue(backlog)
+    self.samples = 0
+    self.dropped = 0
+    self.last_field_builds = 0
+    self.last_nearest_searches = 0
+    self.writer = threading.Thread(target=self.write_samples, name='telemetry')
+    self.writer.daemon = True
+    self.writer.start()
+
+  def end_tick(self, world):
+    if world.tick % self.every == 0:
+      record = sample(world, world.field_builds - self.last_field_builds,
+                      world.nearest_searches - self.last_nearest_searches)
+      self.last_field_builds = world.field_builds
+      self.last_nearest_searches = world.nearest_searches
+      try:
+        self.queue.put_nowait(record)
+        self.samples += 1
+      except Queue.Full:
+        self.dropped += 1
+
+  def write_samples(self):
+    flushed = time.time()
+    while True:
+      try:
+        record = self.queue.get(timeout=self.flush_seconds)
+      except Queue.Empty:
+        record = False # just time to flush
+      if record is None:
+        break
+      if record:
+        self.sink.write(record)
+      if time.time() - flushed >= self.flush_seconds:
+        self.sink.stream.flush()
+        flushed = time.time()
+    self.sink.stream.flush()
+
+  def close(self):
+    """write out the queued samples and close the sink's stream"""
+    if self.writer.is_alive():
+      self.queue.put(None)
+      self.writer.join()
+    self.sink.stream.close()
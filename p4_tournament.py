@@ -0,0 +1,110 @@
+# play brains modules against the same worlds, one headless match per
+# (module, worldgen_seed), spread over every core
+#
+# usage: python p4_tournament.py p4_brains[,other_brains] [--seeds 1-20] [--ticks 3000]
+#                                [--processes N] [--out results.json]
+
+import argparse
+import json
+import math
+import multiprocessing
+import sys
+import time
+import p4_game
+
+METRICS = ['slugs', 'mantises', 'nest_amount', 'resources_consumed']
+
+def parse_seeds(text):
+  """'1-5,9' -> [1, 2, 3, 4, 5, 9]"""
+  seeds = []
+  for part in text.split(','):
+    if '-' in part:
+      first, last = part.split('-')
+      seeds.extend(range(int(first), int(last)+1))
+    else:
+      seeds.append(int(part))
+  return seeds
+
+def play(match):
+  """run one match and measure how it ended; module-level so pool workers
+  can unpickle it"""
+  name, seed, ticks = match
+  brains = p4_game.load_brains(name)
+  specification = dict(brains.world_specification)
+  specification['worldgen_seed'] = seed
+  world = p4_game.World(p4_game.CANVAS_WIDTH, p4_game.CANVAS_WIDTH)
+  world.populate(specification, brains.brain_classes)
+  resources = world.objects_by_class[p4_game.Resource]
+  resources_before = sum(r.amount for r in resources)
+
+  dt = p4_game.SIMULATION_TICK_DELAY_MS/1000.0
+  start = time.time()
+  for i in range(ticks):
+    world.update(dt)
+  elapsed = time.time() - start
+
+  resources = world.objects_by_class[p4_game.Resource]
+  return {
+    'brains': name,
+    'seed': seed,
+    'ticks': ticks,
+    'seconds': elapsed,
+    'slugs': len(world.objects_by_class[p4_game.Slug]),
+    'mantises': len(world.objects_by_class[p4_game.Mantis]),
+    'nest_amount': sum(n.amount for n in world.objects_by_class[p4_game.Nest]),
+    'resources_consumed': resources_before - sum(r.amount for r in resources),
+  }
+
+def run(names, seeds, ticks, processes=None):
+  """play every module on every seed; results come back in match order no
+  matter which worker finished first"""
+  matches = [(name, seed, ticks) for name in names for seed in seeds]
+  pool = multiprocessing.Pool(processes or multiprocessing.cpu_count())
+  try:
+    return pool.map(play, matches, chunksize=1)
+  finally:
+    pool.close()
+    pool.join()
+
+def summarize(results):
+  """mean and standard deviation of each metric per brains module"""
+  by_brains = {}
+  for result in results:
+    by_brains.setdefault(result['brains'], []).append(result)
+  summary = {}
+  for name, rows in by_brains.items():
+    stats = {'matches': len(rows)}
+    for metric in METRICS:
+      values = [row[metric] for row in rows]
+      mean = sum(values) / float(len(values))
+      spread = math.sqrt(sum((v - mean)**2 for v in values) / len(values))
+      stats[metric] = (mean, spread)
+    summary[name] = stats
+  return summary
+
+def print_summary(summary):
+  print "%-20s %7s  %s" % ('brains', 'matches', '  '.join('%-22s' % m for m in METRICS))
+  for name in sorted(summary):
+    stats = summary[name]
+    print "%-20s %7d  %s" % (name, stats['matches'],
+        '  '.join('%-22s' % ('%.2f +- %.2f' % stats[m]) for m in METRICS))
+
+def main(argv):
+  parser = argparse.ArgumentParser(description='headless brains tournament')
+  parser.add_argument('brains', help='comma-separated brains modules')
+  parser.add_argument('--seeds', default='1-10')
+  parser.add_argument('--ticks', type=int, default=3000)
+  parser.add_argument('--processes', type=int, help='defaults to one per core')
+  parser.add_argument('--out')
+  args = parser.parse_args(argv[1:])
+
+  start = time.time()
+  results = run(args.brains.split(','), parse_seeds(args.seeds), args.ticks, args.processes)
+  print_summary(summarize(results))
+  print "%d matches in %.1fs" % (len(results), time.time() - start)
+  if args.out:
+    with open(args.out, 'w') as f:
+      json.dump(results, f, indent=1, sort_keys=True)
+
+if __name__ == '__main__':
+  main(sys.argv)
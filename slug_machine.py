@@ -1,150 +1,111 @@
-# A state machine for slugs
+# A table-driven state machine for slugs
+#
+# States are shared singletons; anything that belongs to one slug (like
+# where SSMove is headed) lives on its SlugStateMachine. Every event looks
+# up its handler in MESSAGES, orders are looked up in ORDERS and collision
+# reactions in COLLISIONS, and the resulting state is run, as before, on
+# every event -- except the PASSIVE ones, which only run it if they change
+# it.
+import logging
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
 class SlugStateMachine():
 	def __init__(self, body):
 		self.body = body
 		self.has_resource = False
+		self.target = None # where SSMove is headed
 		# Initialize to idle
-		self.currentState = SlugStateMachine.Idle()
-		self.currentState.run(self.body)
-		SlugStateMachine.OrderStates = {
-			"a": SlugStateMachine.Attack,
-			"b": SlugStateMachine.Build,
-			"h": SlugStateMachine.Harvest,
-			"i": SlugStateMachine.Idle
-			# Move is indexed on a tuple, so special case that out when getting a move order
-		}
-		SlugStateMachine.MessageMap = {
-			"order":  SlugStateMachine.get_order,
-			"collide": SlugStateMachine.handle_collision,
-			"timer": SlugStateMachine.handle_timer
-		}
-
-	def get_state_for_stuff(self, message, details):
-		if SlugStateMachine.MessageMap.has_key(message):
-			return SlugStateMachine.MessageMap[message](self, details)
-		else:
-			print "Unhandled Message: ", message
+		self.currentState = IDLE
+		self.currentState.run(self, self.body)
 
 	def get_order(self, details):
 		if type(details) is tuple:
-			return SlugStateMachine.Move(details)
-		elif SlugStateMachine.OrderStates.has_key(details):
-			return SlugStateMachine.OrderStates[details]();
-		else:
-			print "Unhandled order: ", details
+			self.target = details
+			return MOVE
+		state = ORDERS.get(details)
+		if state is None:
+			log.warning("Unhandled order: %s", details)
+		return state
 
 	def handle_collision(self, details):
-		return self.currentState.handle_collision(self.body, details)
+		state = self.currentState
+		what = details['what']
+		react = COLLISIONS.get((state, what))
+		if react:
+			nextState = react(self, self.body, details['who'])
+			if nextState:
+				return nextState
+		if state.panics and what == "Mantis" and self.body.amount < 0.5:
+			log.info("Starting to flee")
+			return FLEE
+		return state
+
+	def ignore(self, details):
+		return self.currentState
 
 	def handle_timer(self, details): #TODO: revisit timer
-		print self.currentState
+		log.debug("%s", self.currentState)
 		return self.currentState
 
 	def transition(self, message, details):
-		if message is not 'collide': print message, details
-		nextState = self.get_state_for_stuff(message, details)
-		self.currentState = self.currentState.next(nextState)
+		if message not in QUIET: log.debug("%s %s", message, details)
+		handler = MESSAGES.get(message)
+		if handler:
+			nextState = handler(self, details)
+		else:
+			log.warning("Unhandled Message: %s", message)
+			nextState = None
+		if message in PASSIVE and nextState is self.currentState:
+			return
+		if nextState:
+			self.currentState = nextState
+		else:
+			log.debug("Input not supported: %s", nextState)
 		try:
-			self.currentState.run(self.body)
+			self.currentState.run(self, self.body)
 		except ValueError:
-			print "Something wasn't found, idling"
-			self.currentState = SlugStateMachine.Idle()
-		# if nextState:
-		# 	self.currentState = nextState
+			log.info("Something wasn't found, idling")
+			self.currentState = IDLE
 
 
 # State base class
-class State:
-	def run(self):
-		assert 0, "run not implemented"
-	def next(self, inp):
-		assert 0, "next not implemented"
-	def __str__(self):
-		return str(self.__class__.__name__)
+class SlugState(object):
+	panics = True # flees from mantises when hurt
 
-# Base class for a state with a transitions map
-class StateT(State):
-	def __init__(self):
-		self.transitions = None
-	# Lazily initialize the transition map, needs to be overwritten
-	def lazy_init(self):
-		assert 0, "lazy_init not implemented"
-	def next(self, inp):
-		if not self.transitions:
-			self.lazy_init()
-		if self.transitions and self.transitions.has_key(inp):
-			return self.transitions[inp]
-		else:
-			print "Input not supported: ", inp
-			return self
-
-class SlugStateT(StateT):
-	def lazy_init(self):
-		self.transitions = {
-			"SSMove":SlugStateMachine.Move,
-			"SSIdle":SlugStateMachine.Idle,
-			"SSAttack":SlugStateMachine.Attack,
-			"SSBuild":SlugStateMachine.Build,
-			"SSHarvest":SlugStateMachine.Harvest,
-			"SSFlee":SlugStateMachine.Flee
-		}
-	def run(self, body):
+	def __init__(self, name):
+		self.name = name # module-level name of the singleton
+
+	def run(self, machine, body):
 		assert 0, "run not implemented"
 
-	def next(self, inp):
-		if not self.transitions:
-			self.lazy_init()
-		if self.transitions and self.transitions.has_key(str(inp)):
-			return inp
-		else:
-			print "Input not supported: ", inp
-			return self
-	def handle_collision(self, body, details):
-		what = details['what']
-		who = details['who']
-		if what is "Mantis" and body.amount < 0.5:
-			print "Starting to flee"
-			return SlugStateMachine.Flee()
-		else:
-			return self
+	def __str__(self):
+		return str(self.__class__.__name__)
 
+	def __reduce__(self):
+		# pickle as a reference to the singleton, never as a copy
+		return self.name
 
 # States
-class SSIdle(SlugStateT):
-	def run(self, body):
+class SSIdle(SlugState):
+	def run(self, machine, body):
 		body.stop()
 
-class SSAttack(SlugStateT):
-	def run(self, body):
+class SSAttack(SlugState):
+	def run(self, machine, body):
 		target = body.find_nearest("Mantis")
 		body.follow(target)
 		body.set_alarm(1)
 
-	def handle_collision(self, body, details):
-		what = details['what']
-		who = details['who']
-		if what is "Mantis":
-			who.amount -= 0.05
-		return SlugStateT.handle_collision(self, body, details)
-
-class SSBuild(SlugStateT):
-	def run(self, body):
+class SSBuild(SlugState):
+	def run(self, machine, body):
 		target = body.find_nearest("Nest")
 		body.follow(target)
 		body.set_alarm(1)
 
-	def handle_collision(self, body, details):
-		what = details['what']
-		who = details['who']
-		if what is "Nest":
-			who.amount += 0.01
-			if who.amount > 1.0:
-				who.amount = 1.0
-				return SlugStateMachine.Idle()
-		return SlugStateT.handle_collision(self, body, details)
-
-class SSHarvest(SlugStateT):
-	def run(self, body):
+class SSHarvest(SlugState):
+	def run(self, machine, body):
 		if body.has_resource:
 			target = body.find_nearest("Nest")
 		else:
@@ -152,48 +113,79 @@ class SSHarvest(SlugStateT):
 		body.follow(target)
 		body.set_alarm(1)
 
-	def handle_collision(self, body, details):
-		what = details['what']
-		who = details['who']
-		if what is "Resource" and not body.has_resource:
-			body.has_resource = True
-			who.amount -= 0.25
-		elif what is "Nest":
-			body.has_resource = False
-		return SlugStateT.handle_collision(self, body, details)
-
-class SSFlee(SlugStateT):
-	def run(self, body):
+class SSFlee(SlugState):
+	panics = False
+
+	def run(self, machine, body):
 		target = body.find_nearest("Nest")
 		body.follow(target)
 		body.set_alarm(1)
 
-	def handle_collision(self, body, details):
-		what = details['what']
-		who = details['who']
-		# Heal when colliding with a nest
-		if what is "Nest":
-			body.amount += 0.05
-			if body.amount >= 1.0:
-				body.amount = 1.0
-				return SlugStateMachine.Idle()
-		return self
-
-class SSMove(SlugStateT):
-	def __init__(self, target):
-		SlugStateT.__init__(self)
-		self.target = target
-	def run(self, body):
-		body.go_to(self.target)
+class SSMove(SlugState):
+	def run(self, machine, body):
+		body.go_to(machine.target)
 		body.set_alarm(1)
 
-SlugStateMachine.Attack = SSAttack
-SlugStateMachine.Idle = SSIdle
-SlugStateMachine.Build = SSBuild
-SlugStateMachine.Harvest = SSHarvest
-SlugStateMachine.Move = SSMove
-SlugStateMachine.Flee = SSFlee
-
-
-
-
+IDLE = SSIdle('IDLE')
+ATTACK = SSAttack('ATTACK')
+BUILD = SSBuild('BUILD')
+HARVEST = SSHarvest('HARVEST')
+FLEE = SSFlee('FLEE')
+MOVE = SSMove('MOVE')
+
+# Collision reactions; returning a state overrides the usual flee check
+def bite(machine, body, who):
+	who.amount -= 0.05
+
+def build(machine, body, who):
+	who.amount += 0.01
+	if who.amount > 1.0:
+		who.amount = 1.0
+		return IDLE
+
+def pick_up(machine, body, who):
+	if not body.has_resource:
+		body.has_resource = True
+		who.amount -= 0.25
+
+def drop_off(machine, body, who):
+	body.has_resource = False
+
+def heal(machine, body, who):
+	body.amount += 0.05
+	if body.amount >= 1.0:
+		body.amount = 1.0
+		return IDLE
+	return FLEE
+
+MESSAGES = {
+	"order": SlugStateMachine.get_order,
+	"collide": SlugStateMachine.handle_collision,
+	"collide_enter": SlugStateMachine.handle_collision,
+	"collide_stay": SlugStateMachine.handle_collision,
+	"collide_exit": SlugStateMachine.ignore,
+	"timer": SlugStateMachine.handle_timer,
+}
+
+# a contact going on or ending doesn't start the state over
+PASSIVE = frozenset(["collide_stay", "collide_exit"])
+
+# too frequent to trace
+QUIET = frozenset(["collide", "collide_enter", "collide_stay", "collide_exit"])
+
+# Move is indexed on a tuple, so get_order special cases it
+ORDERS = {
+	"a": ATTACK,
+	"b": BUILD,
+	"h": HARVEST,
+	"i": IDLE,
+}
+
+# (state, what was bumped into) -> reaction
+COLLISIONS = {
+	(ATTACK, "Mantis"): bite,
+	(BUILD, "Nest"): build,
+	(HARVEST, "Resource"): pick_up,
+	(HARVEST, "Nest"): drop_off,
+	(FLEE, "Nest"): heal,
+}
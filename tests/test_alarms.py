@@ -0,0 +1,70 @@
+import unittest
+import p4_game
+
+class Recorder(object):
+  """a brain that notes (tick, name) for every timer event"""
+
+  def __init__(self, body, name, log):
+    self.body = body
+    self.name = name
+    self.log = log
+
+  def handle_event(self, message, details):
+    if message == 'timer':
+      self.log.append((self.body.world.tick, self.name))
+
+class AlarmTest(unittest.TestCase):
+
+  def setUp(self):
+    self.world = p4_game.World(400, 400)
+    self.log = []
+
+  def slug(self, name, register=True):
+    slug = p4_game.Slug(self.world)
+    slug.position = (30 + 40*len(self.world.all_objects), 200)
+    slug.brain = Recorder(slug, name, self.log)
+    if register:
+      self.world.register(slug)
+    return slug
+
+  def run_for(self, ticks):
+    for k in range(ticks):
+      self.world.update(0.01)
+
+  def test_deadline_then_sequence_order(self):
+    for name in 'cab':
+      self.slug(name).set_alarm(0.05)
+    self.slug('d').set_alarm(0.03)
+    self.run_for(10)
+    self.assertEqual(self.log, [(4, 'd'), (6, 'c'), (6, 'a'), (6, 'b')])
+
+  def test_earlier_alarm_replaces_a_later_one(self):
+    slug = self.slug('x')
+    slug.set_alarm(0.5)
+    slug.set_alarm(0.02)
+    slug.set_alarm(0.3) # later than the one set, so left out
+    self.assertEqual(len(self.world.alarms), 2)
+    self.run_for(80)
+    self.assertEqual(self.log, [(3, 'x')])
+
+  def test_alarm_set_before_register_goes_off_once(self):
+    # as populate does it, leaving two entries for the same deadline
+    slug = self.slug('y', register=False)
+    slug.set_alarm(0)
+    self.world.register(slug)
+    self.assertEqual(len(self.world.alarms), 2)
+    self.run_for(5)
+    self.assertEqual(self.log, [(1, 'y')])
+
+  def test_unregistered_objects_wait_until_they_are_back(self):
+    slug = self.slug('z')
+    slug.set_alarm(0.02)
+    self.world.unregister(slug)
+    self.run_for(10)
+    self.assertEqual(self.log, [])
+    self.world.register(slug)
+    self.run_for(10)
+    self.assertEqual(self.log, [(11, 'z')])
+
+if __name__ == '__main__':
+  unittest.main()
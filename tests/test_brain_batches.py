@@ -0,0 +1,105 @@
+import unittest
+import p4_brains
+import p4_game
+
+class BatchRecorder(object):
+  """a brain class that takes its events for all bodies in one call"""
+  calls = None # [(tick, bodies, events)], set by each test
+
+  def __init__(self, body):
+    self.body = body
+
+  @classmethod
+  def handle_events_batch(cls, bodies, events):
+    cls.calls.append((bodies[0].world.tick, list(bodies), [list(e) for e in events]))
+
+class Recorder(object):
+  """a brain that takes its events one at a time"""
+  log = None # [(tick, entity_id, message)], set by each test
+
+  def __init__(self, body):
+    self.body = body
+
+  def handle_event(self, message, details):
+    self.log.append((self.body.world.tick, self.body.entity_id, message))
+
+class SendBatchTest(unittest.TestCase):
+
+  def setUp(self):
+    BatchRecorder.calls = []
+    Recorder.log = []
+    self.world = p4_game.World(800, 400)
+
+  def slug(self, brain_class):
+    slug = p4_game.Slug(self.world)
+    slug.position = (30 + 40*len(self.world.all_objects), 200)
+    slug.brain = brain_class(slug)
+    self.world.register(slug)
+    return slug
+
+  def test_timers_arrive_in_one_call_per_tick(self):
+    batched = [self.slug(BatchRecorder) for k in range(6)]
+    plain = [self.slug(Recorder) for k in range(2)]
+    for k, slug in enumerate(batched):
+      slug.set_alarm(0.015 if k % 2 else 0.035)
+    for slug in plain:
+      slug.set_alarm(0.015)
+    for k in range(6):
+      self.world.update(0.01)
+
+    calls = BatchRecorder.calls
+    self.assertEqual([tick for tick, bodies, events in calls], [2, 4])
+    self.assertEqual(calls[0][1], batched[1::2])
+    self.assertEqual(calls[1][1], batched[0::2])
+    for tick, bodies, events in calls:
+      self.assertEqual(events, [[('timer', None)]]*len(bodies))
+    self.assertEqual(Recorder.log, [(2, slug.entity_id, 'timer') for slug in plain])
+
+  def test_queued_events_stay_with_their_bodies(self):
+    batched = [self.slug(BatchRecorder) for k in range(4)]
+    plain = self.slug(Recorder)
+    world = self.world
+    for slug in reversed(batched + [plain]):
+      world.queue_event(slug, 'poke', slug.entity_id)
+    world.queue_event(batched[2], 'prod', None)
+    world.deliver_events()
+
+    self.assertEqual(len(BatchRecorder.calls), 1)
+    tick, bodies, events = BatchRecorder.calls[0]
+    self.assertEqual(bodies, list(reversed(batched)))
+    for body, queued in zip(bodies, events):
+      expected = [('poke', body.entity_id)]
+      if body is batched[2]:
+        expected.append(('prod', None))
+      self.assertEqual(queued, expected)
+    self.assertEqual(Recorder.log, [(0, plain.entity_id, 'poke')])
+
+  def test_single_sends_use_the_batch_too(self):
+    slug = self.slug(BatchRecorder)
+    self.world.send(slug, 'collide', {'what': 'Nest', 'who': None})
+    self.assertEqual(BatchRecorder.calls,
+                     [(0, [slug], [[('collide', {'what': 'Nest', 'who': None})]])])
+
+class HerdingMantisBrainTest(unittest.TestCase):
+
+  def test_idle_mantises_wander_in_herds(self):
+    world = p4_game.World(800, 800)
+    specification = dict(p4_brains.world_specification, mantises=20, slugs=0)
+    world.populate(specification, {'mantis': p4_brains.HerdingMantisBrain})
+    mantises = list(world.objects_by_class[p4_game.Mantis])
+    world.update(0.01) # every alarm was set to 0
+
+    groups = {} # target -> [mantis]
+    for mantis in mantises:
+      self.assertIsInstance(mantis.controller, p4_game.FieldFollower)
+      groups.setdefault(mantis.group_order.target, []).append(mantis)
+    self.assertEqual(len(groups), 3) # 20 split into herds of up to 8
+    self.assertTrue(all(len(herd) <= p4_brains.HerdingMantisBrain.wander_group
+                        for herd in groups.values()))
+    self.assertEqual(world.field_builds, 3)
+    for mantis in mantises:
+      beats = mantis.timer_deadline / p4_brains.HerdingMantisBrain.wander_beat
+      self.assertAlmostEqual(beats, round(beats))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,170 @@
+import math
+import unittest
+import p4_game
+import slug_machine
+
+class Listener(object):
+  """a brain that only writes down what it hears"""
+
+  def __init__(self, body):
+    self.body = body
+    self.heard = []
+
+  def handle_event(self, message, details):
+    self.heard.append((message, details['what'] if details else None))
+
+def place(world, clazz, position, brain=False):
+  obj = clazz(world)
+  obj.position = position
+  if brain:
+    obj.brain = Listener(obj)
+  world.register(obj)
+  return obj
+
+def gap(a, b):
+  dx = a.position[0] - b.position[0]
+  dy = a.position[1] - b.position[1]
+  return math.sqrt(dx*dx + dy*dy) - a.radius - b.radius
+
+class CollisionRulesTest(unittest.TestCase):
+
+  def test_table_names_each_pair_once(self):
+    for first, second in p4_game.COLLISION_RULES:
+      self.assertTrue(issubclass(first, p4_game.GameObject))
+      self.assertTrue(issubclass(second, p4_game.GameObject))
+      if first is not second:
+        self.assertNotIn((second, first), p4_game.COLLISION_RULES)
+
+  def test_slug_is_told_about_resource_and_pushed_out(self):
+    world = p4_game.World(400, 400)
+    slug = place(world, p4_game.Slug, (200, 200), brain=True)
+    resource = place(world, p4_game.Resource, (215, 200))
+    world.resolve_collisions()
+    self.assertEqual(slug.brain.heard, [('collide', 'Resource')])
+    self.assertEqual(resource.position, (215, 200)) # static side stays
+    self.assertAlmostEqual(gap(slug, resource), 0)
+
+  def test_obstacles_push_without_telling(self):
+    world = p4_game.World(400, 400)
+    slug = place(world, p4_game.Slug, (200, 200), brain=True)
+    obstacle = place(world, p4_game.Obstacle, (220, 200))
+    world.resolve_collisions()
+    self.assertEqual(slug.brain.heard, [])
+    self.assertAlmostEqual(gap(slug, obstacle), 0)
+
+  def test_mantis_and_slug_both_hear(self):
+    world = p4_game.World(400, 400)
+    slug = place(world, p4_game.Slug, (200, 200), brain=True)
+    mantis = place(world, p4_game.Mantis, (210, 200), brain=True)
+    world.resolve_collisions()
+    self.assertEqual(slug.brain.heard, [('collide', 'Mantis')])
+    self.assertEqual(mantis.brain.heard, [('collide', 'Slug')])
+    self.assertTrue(gap(slug, mantis) > -1e-9)
+
+  def test_pairs_without_a_rule_overlap(self):
+    world = p4_game.World(400, 400)
+    nest = place(world, p4_game.Nest, (200, 200))
+    resource = place(world, p4_game.Resource, (210, 200))
+    world.resolve_collisions()
+    self.assertEqual((nest.position, resource.position), ((200, 200), (210, 200)))
+
+  def test_world_rules_override_the_table(self):
+    world = p4_game.World(400, 400)
+    world.collision_rules[(p4_game.Slug, p4_game.Resource)] = p4_game.CollisionRule(
+        eject=False, randomize=False, notify=False)
+    slug = place(world, p4_game.Slug, (200, 200), brain=True)
+    place(world, p4_game.Resource, (215, 200))
+    world.resolve_collisions()
+    self.assertEqual(slug.brain.heard, [])
+    self.assertEqual(slug.position, (200, 200))
+
+class ContactEventsTest(unittest.TestCase):
+
+  def setUp(self):
+    self.world = p4_game.World(400, 400)
+    self.world.collision_events = 'contacts'
+    # without ejecting, a contact lasts for as long as the overlap
+    for pair in [(p4_game.Slug, p4_game.Nest), (p4_game.Mantis, p4_game.Slug)]:
+      self.world.collision_rules[pair] = p4_game.CollisionRule(eject=False, randomize=False, notify=True)
+    self.slug = place(self.world, p4_game.Slug, (200, 200), brain=True)
+
+  def test_enter_stay_exit(self):
+    world, slug = self.world, self.slug
+    nest = place(world, p4_game.Nest, (300, 200))
+    for k in range(3):
+      world.tick += 1
+      world.resolve_collisions()
+    self.assertEqual(slug.brain.heard, [('collide_enter', 'Nest'), ('collide_stay', 'Nest'),
+                                        ('collide_stay', 'Nest')])
+    slug.position = (50, 50)
+    world.tick += 1
+    world.resolve_collisions()
+    self.assertEqual(slug.brain.heard[-1], ('collide_exit', 'Nest'))
+
+  def test_no_stays_when_turned_off(self):
+    world, slug = self.world, self.slug
+    world.contact_stay_ticks = None
+    place(world, p4_game.Nest, (300, 200))
+    for k in range(3):
+      world.tick += 1
+      world.resolve_collisions()
+    self.assertEqual(slug.brain.heard, [('collide_enter', 'Nest')])
+
+  def test_no_exit_for_the_departed(self):
+    world, slug = self.world, self.slug
+    mantis = place(world, p4_game.Mantis, (210, 200), brain=True)
+    world.tick += 1
+    world.resolve_collisions()
+    world.unregister(mantis)
+    world.tick += 1
+    world.resolve_collisions()
+    self.assertEqual(slug.brain.heard, [('collide_enter', 'Mantis'), ('collide_exit', 'Mantis')])
+    self.assertEqual(mantis.brain.heard, [('collide_enter', 'Slug')])
+
+class Body(object):
+  """just enough of a Slug for SlugStateMachine, counting its paths"""
+
+  def __init__(self):
+    self.amount = 1.0
+    self.has_resource = False
+    self.paths = 0
+
+  def go_to(self, target):
+    self.paths += 1
+
+  def find_nearest(self, classname):
+    return None
+
+  def follow(self, target):
+    self.paths += 1
+
+  def set_alarm(self, dt):
+    pass
+
+  def stop(self):
+    pass
+
+class PassiveMessagesTest(unittest.TestCase):
+
+  def test_lasting_contacts_dont_rerun_the_state(self):
+    body = Body()
+    machine = slug_machine.SlugStateMachine(body)
+    machine.transition('order', (100, 100))
+    self.assertEqual((machine.currentState, body.paths), (slug_machine.MOVE, 1))
+    other = p4_game.Contact('Slug', None)
+    machine.transition('collide_stay', other)
+    machine.transition('collide_exit', other)
+    self.assertEqual(body.paths, 1)
+    machine.transition('collide_enter', other)
+    self.assertEqual(body.paths, 2)
+
+  def test_a_stay_that_changes_state_runs_it(self):
+    body = Body()
+    machine = slug_machine.SlugStateMachine(body)
+    machine.transition('order', (100, 100))
+    body.amount = 0.1
+    machine.transition('collide_stay', p4_game.Contact('Mantis', None))
+    self.assertEqual((machine.currentState, body.paths), (slug_machine.FLEE, 2))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+import p4_clock
+
+class Mover(object):
+  static = False
+
+  def __init__(self):
+    self.position = (0.0, 0.0)
+
+class CountingWorld(object):
+  """stands in for a World: each update moves its one object 10 pixels
+  to the right"""
+
+  def __init__(self):
+    self.mover = Mover()
+    self.all_objects = [self.mover]
+    self.updates = []
+
+  def update(self, dt):
+    self.updates.append(dt)
+    x, y = self.mover.position
+    self.mover.position = (x + 10, y)
+
+class FixedStepTest(unittest.TestCase):
+
+  # a step that adds up exactly in binary keeps the counts free of rounding
+  step = 0.25
+
+  def test_steps_follow_wall_time(self):
+    clock = p4_clock.FixedStep(CountingWorld(), self.step)
+    self.assertEqual(clock.frame(now=100.0), 0)
+    self.assertEqual(clock.frame(now=101.0), 4)
+    self.assertEqual(clock.frame(now=101.1), 0)
+    self.assertEqual(clock.frame(now=101.3), 1)
+    self.assertEqual((clock.steps, clock.frames, clock.dropped), (5, 4, 0.0))
+
+  def test_a_stall_runs_max_steps_and_drops_the_rest(self):
+    world = CountingWorld()
+    clock = p4_clock.FixedStep(world, self.step, max_steps=5)
+    clock.frame(now=0.0)
+    self.assertEqual(clock.frame(now=10.0), 5) # 40 steps due
+    self.assertEqual(clock.dropped, 35*self.step)
+    self.assertEqual(world.updates, [self.step]*5)
+    # nothing is owed to the next frame
+    self.assertEqual(clock.frame(now=10.0), 0)
+    self.assertEqual(clock.frame(now=10.25), 1)
+
+  def test_speed_scales_the_steps(self):
+    normal = p4_clock.FixedStep(CountingWorld(), self.step, max_steps=100)
+    double = p4_clock.FixedStep(CountingWorld(), self.step, max_steps=100, speed=2)
+    for now in (0.0, 1.0, 2.5, 4.0):
+      normal.frame(now=now)
+      double.frame(now=now)
+    self.assertEqual((normal.steps, double.steps), (16, 32))
+    self.assertEqual(double.world.updates, [self.step]*32)
+
+  def test_alpha_and_interpolated_positions(self):
+    world = CountingWorld()
+    clock = p4_clock.FixedStep(world, self.step, interpolate=True)
+    clock.frame(now=0.0)
+    self.assertEqual(clock.frame(now=0.6), 2)
+    self.assertAlmostEqual(clock.alpha, 0.4)
+    self.assertEqual(world.mover.position, (20.0, 0.0))
+    x, y = clock.position(world.mover)
+    self.assertAlmostEqual(x, 14.0)
+    self.assertEqual(y, 0.0)
+
+    # without interpolation objects are drawn where they are
+    clock.interpolate = False
+    self.assertEqual(clock.position(world.mover), (20.0, 0.0))
+
+if __name__ == '__main__':
+  unittest.main()
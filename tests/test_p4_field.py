@@ -0,0 +1,248 @@
+import heapq
+import math
+import random
+import unittest
+import p4_field
+import p4_game
+
+def original_field(width, height, target, blockers, expansion, bin_size=20):
+  """the dict-based search build_distance_field started out with, kept to
+  check the array-backed one against"""
+  obstacles = {}
+  for i in range(int(width/bin_size)):
+    for j in range(int(height/bin_size)):
+      obstacles[(i,j)] = False
+  for (x, y), radius in blockers:
+    i_lo = int((x - radius)/bin_size - 1)
+    i_hi = int((x + radius)/bin_size + 1)
+    j_lo = int((y - radius)/bin_size - 1)
+    j_hi = int((y + radius)/bin_size + 1)
+    for i in range(i_lo, i_hi+1):
+      for j in range(j_lo, j_hi+1):
+        dx, dy = x - i*bin_size, y - j*bin_size
+        if math.sqrt(dx*dx+dy*dy) < radius + expansion:
+          obstacles[(i,j)] = True
+
+  dist = {}
+  start = (int(target[0]/bin_size), int(target[1]/bin_size))
+  dist[start] = 0
+  queue = [(0,start)]
+  while queue:
+    d, c = heapq.heappop(queue)
+    for di, dj in [(-1,0),(1,0),(0,-1),(0,1)]:
+      next_c = (c[0] + di, c[1] + dj)
+      if next_c in obstacles:
+        next_d = d + (1e6 if obstacles[next_c] else 1)
+        if next_c not in dist or next_d < dist[next_c]:
+          dist[next_c] = d
+          heapq.heappush(queue, (next_d, next_c))
+
+  def lookup(position):
+    x,y = position
+    alpha = float(x % bin_size)/bin_size
+    beta = float(y % bin_size)/bin_size
+    i, j = int(x / bin_size), int(y / bin_size)
+    dx, dy = x - width/2, y - height/2
+    default = 2*math.sqrt(dx*dx+dy*dy)
+    a = dist.get((i,j),default)
+    b = dist.get((i+1,j),default)
+    c = dist.get((i,j+1),default)
+    d = dist.get((i+1,j+1),default)
+    ab = (1-alpha)*a + alpha*b
+    cd = (1-alpha)*c + alpha*d
+    return (1-beta)*ab + beta*cd
+
+  return lookup
+
+def scattered_world(seed, width=400, height=300, obstacles=12, bin_size=20):
+  rng = random.Random(seed)
+  world = p4_game.World(width, height, field_bin_size=bin_size)
+  for k in range(obstacles):
+    obj = p4_game.Obstacle(world)
+    obj.position = (rng.random()*width, rng.random()*height)
+    obj.radius = 5 + 60*rng.random()
+    world.register(obj)
+  return world, rng
+
+class DistanceFieldTest(unittest.TestCase):
+
+  def test_matches_original_search(self):
+    for seed in range(4):
+      world, rng = scattered_world(seed)
+      blockers = list(world.all_objects)
+      target = (rng.random()*world.width, rng.random()*world.height)
+      expansion = rng.choice([0, 5, 10])
+      field = world.build_distance_field(target, blockers, expansion)
+      expected = original_field(world.width, world.height, target,
+                                [(obj.position, obj.radius) for obj in blockers], expansion)
+      for k in range(300):
+        # a margin past the edges, where both fall back to the default
+        position = (rng.uniform(-30, world.width + 30), rng.uniform(-30, world.height + 30))
+        self.assertAlmostEqual(field(position), expected(position), places=6)
+
+  def test_other_bin_sizes(self):
+    for bin_size in (10, 12.5, 35):
+      world, rng = scattered_world(1, bin_size=bin_size)
+      blockers = list(world.all_objects)
+      target = (rng.random()*world.width, rng.random()*world.height)
+      field = world.build_distance_field(target, blockers, 5)
+      expected = original_field(world.width, world.height, target,
+                                [(obj.position, obj.radius) for obj in blockers], 5, bin_size)
+      for k in range(300):
+        position = (rng.uniform(-30, world.width + 30), rng.uniform(-30, world.height + 30))
+        self.assertAlmostEqual(field(position), expected(position), places=6)
+
+      # and the cached fields go_to uses
+      slug = p4_game.Slug(world)
+      slug.position = (1, 1)
+      world.register(slug)
+      slug.go_to(target)
+      self.assertEqual(world.field_builds, 2)
+
+  def test_lookup_many_matches_single_lookups(self):
+    world, rng = scattered_world(7)
+    field = world.build_distance_field((200, 150), list(world.all_objects), 10)
+    positions = [(rng.uniform(-30, 430), rng.uniform(-30, 330)) for k in range(200)]
+    for position, value in zip(positions, field.lookup_many(positions)):
+      self.assertAlmostEqual(value, field(position), places=6)
+
+class FieldCacheTest(unittest.TestCase):
+
+  def test_least_recently_used_goes_first(self):
+    cache = p4_field.FieldCache(capacity=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    self.assertEqual(cache.get('a'), 1)
+    cache.put('c', 3)
+    self.assertEqual(cache.get('b'), None)
+    self.assertEqual((cache.get('a'), cache.get('c')), (1, 3))
+    self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+  def slugs(self, world, positions):
+    slugs = []
+    for position in positions:
+      slug = p4_game.Slug(world)
+      slug.position = position
+      world.register(slug)
+      slugs.append(slug)
+    return slugs
+
+  def test_units_going_the_same_way_share_a_field(self):
+    world, rng = scattered_world(3)
+    a, b = self.slugs(world, [(20, 20), (380, 280)])
+    a.go_to((200, 150))
+    b.go_to((205, 155)) # same cell
+    self.assertEqual(world.field_builds, 1)
+    self.assertIs(a.controller.field, b.controller.field)
+
+  def test_fields_last_until_a_mover_strays(self):
+    world, rng = scattered_world(3)
+    a, b = self.slugs(world, [(20, 20), (380, 280)])
+    a.go_to((200, 150))
+    world.tick += 1
+    b.position = (b.position[0] + world.blocker_tolerance/2, b.position[1])
+    b.go_to((200, 150))
+    self.assertEqual(world.field_builds, 1)
+    world.tick += 1
+    b.position = (b.position[0] + world.blocker_tolerance, b.position[1])
+    b.go_to((200, 150))
+    self.assertEqual(world.field_builds, 2)
+
+class GroupOrderTest(unittest.TestCase):
+
+  def test_group_keeps_its_field_while_it_moves(self):
+    world, rng = scattered_world(5)
+    world.formation_spacing = 30
+    slugs = []
+    for k in range(6):
+      slug = p4_game.Slug(world)
+      slug.position = (30 + 10*k, 30)
+      world.register(slug)
+      slugs.append(slug)
+    world.go_to_together(slugs, (300, 200))
+    self.assertEqual(world.field_builds, 1)
+    offsets = [slug.controller.offset for slug in slugs]
+
+    # the whole group moves well past the tolerance, then paths again
+    for slug in slugs:
+      slug.position = (slug.position[0] + 50, slug.position[1] + 50)
+    world.tick += 1
+    for slug in slugs:
+      slug.go_to((300, 200))
+    self.assertEqual(world.field_builds, 1)
+    self.assertEqual([slug.controller.offset for slug in slugs], offsets)
+
+    # one of them heads elsewhere and leaves the group behind
+    slugs[0].go_to((100, 250))
+    self.assertEqual(slugs[0].group_order, None)
+    self.assertEqual(world.field_builds, 2)
+
+  def test_outsiders_moving_drop_the_group_field(self):
+    world, rng = scattered_world(5)
+    group = []
+    for position in [(30, 30), (50, 30), (380, 280)]:
+      slug = p4_game.Slug(world)
+      slug.position = position
+      world.register(slug)
+      group.append(slug)
+    outsider = group.pop()
+    world.go_to_together(group, (300, 200))
+    outsider.position = (outsider.position[0] - 50, outsider.position[1])
+    world.tick += 1
+    group[0].go_to((300, 200))
+    self.assertEqual(world.field_builds, 2)
+
+class SearchNearestTest(unittest.TestCase):
+
+  def test_matches_minimum_over_full_field(self):
+    for seed in range(6):
+      world, rng = scattered_world(seed)
+      for k in range(8):
+        resource = p4_game.Resource(world)
+        resource.position = (rng.random()*world.width, rng.random()*world.height)
+        world.register(resource)
+      slug = p4_game.Slug(world)
+      slug.position = (rng.random()*world.width, rng.random()*world.height)
+      world.register(slug)
+
+      found, distance = world.search_nearest(slug, p4_game.Resource)
+      self.assertEqual(world.nearest_searches, 1)
+      field = world.distance_field(slug.position, -slug.radius)
+      values = [(field(obj.position), obj) for obj in world.objects_by_class[p4_game.Resource]]
+      best = min(value for value, obj in values)
+      self.assertAlmostEqual(distance, best*world.field_bin_size, places=6)
+      self.assertIn(found, [obj for value, obj in values if value == best])
+
+      # the cached field gives the same answer
+      self.assertEqual(world.search_nearest(slug, p4_game.Resource), (found, distance))
+      self.assertEqual(world.nearest_searches, 1)
+      self.assertEqual(world.search_nearest(slug, p4_game.Resource, max_distance=distance/2),
+                       (None, None))
+
+  def test_edge_outside_reads_like_the_field(self):
+    for seed in range(6):
+      world, rng = scattered_world(seed)
+      world.field_outside = 'edge'
+      # one in the last cell band by the right or bottom edge, where a
+      # corner is off the map, and one somewhere inside
+      resource = p4_game.Resource(world)
+      if seed % 2:
+        resource.position = (world.width - rng.uniform(1, 19), rng.uniform(40, 260))
+      else:
+        resource.position = (rng.uniform(40, 360), world.height - rng.uniform(1, 19))
+      world.register(resource)
+      resource = p4_game.Resource(world)
+      resource.position = (rng.uniform(40, 360), rng.uniform(40, 260))
+      world.register(resource)
+      slug = p4_game.Slug(world)
+      slug.position = (rng.random()*world.width, rng.random()*world.height)
+      world.register(slug)
+
+      found, distance = world.search_nearest(slug, p4_game.Resource)
+      field = world.distance_field(slug.position, -slug.radius)
+      values = [field(obj.position) for obj in world.objects_by_class[p4_game.Resource]]
+      self.assertAlmostEqual(distance, min(values)*world.field_bin_size, places=6)
+      self.assertEqual(world.search_nearest(slug, p4_game.Resource), (found, distance))
+
+if __name__ == '__main__':
+  unittest.main()
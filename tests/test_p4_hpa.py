@@ -0,0 +1,102 @@
+import random
+import unittest
+import numpy
+import p4_brains
+import p4_game
+import p4_hpa
+
+def same(a, b):
+  def entrances(h):
+    return dict((k, sorted(v)) for k, v in h.entrances.items() if v)
+  def edges(h):
+    return dict((k, v) for k, v in h.edges.items() if v)
+  return a.free == b.free and entrances(a) == entrances(b) and edges(a) == edges(b)
+
+class HierarchyTest(unittest.TestCase):
+
+  def test_plans_around_a_wall(self):
+    blocked = numpy.zeros((30, 30), dtype=bool)
+    blocked[15, :25] = True
+    hierarchy = p4_hpa.Hierarchy(blocked, 10)
+    cells = hierarchy.plan((5, 5), (25, 5))
+    self.assertEqual((cells[0], cells[-1]), ((5, 5), (25, 5)))
+    # around the end of the wall, in the clusters by the gap
+    self.assertIn((1, 2), [hierarchy.cluster(cell) for cell in cells])
+
+  def test_unreachable_goal_gets_as_close_as_it_can(self):
+    blocked = numpy.zeros((30, 30), dtype=bool)
+    blocked[15, :] = True
+    hierarchy = p4_hpa.Hierarchy(blocked, 10)
+    cells = hierarchy.plan((5, 5), (25, 5))
+    self.assertEqual((cells[0], cells[-1]), ((5, 5), (14, 5)))
+
+  def test_update_matches_a_fresh_build(self):
+    rng = random.Random(4)
+    blocked = numpy.array([[rng.random() < 0.3 for j in range(40)] for i in range(45)])
+    hierarchy = p4_hpa.Hierarchy(blocked, 10)
+    for k in range(20):
+      i, j = rng.randrange(-3, 45), rng.randrange(-3, 40)
+      box = (i, i + rng.randrange(6), j, j + rng.randrange(6))
+      patch = numpy.array([[rng.random() < 0.5 for b in range(box[2], box[3]+1)]
+                           for a in range(box[0], box[1]+1)])
+      hierarchy.update(patch, box)
+      blocked[max(box[0], 0):box[1]+1, max(box[2], 0):box[3]+1] = \
+          patch[max(-box[0], 0):45-box[0], max(-box[2], 0):40-box[2]]
+      self.assertTrue(same(hierarchy, p4_hpa.Hierarchy(blocked, 10)))
+
+class Idle(object):
+  """a brain that sits still"""
+
+  def __init__(self, body):
+    pass
+
+  def handle_event(self, message, details):
+    pass
+
+class WorldHierarchyTest(unittest.TestCase):
+
+  def setUp(self):
+    self.world = p4_game.World(800, 800)
+    self.world.pathfinder = 'hpa'
+    self.world.populate(p4_brains.world_specification, {'slug': Idle, 'mantis': Idle})
+
+  def test_built_with_the_world(self):
+    self.assertEqual(sorted(self.world.hierarchies), [5, 20]) # slug and mantis radii
+
+  def test_obstacle_changes_patch_it(self):
+    world = self.world
+    obstacle = max(world.objects_by_class[p4_game.Obstacle], key=lambda obj: obj.radius)
+    world.unregister(obstacle)
+    patched = world.hierarchies[5]
+    del world.hierarchies[5]
+    self.assertTrue(same(patched, world.hierarchy(5)))
+    world.register(obstacle)
+    patched = world.hierarchies[5]
+    del world.hierarchies[5]
+    self.assertTrue(same(patched, world.hierarchy(5)))
+
+  def test_nests_and_resources_dont_block(self):
+    world = self.world
+    hierarchy = world.hierarchies[5]
+    resource = world.objects_by_class[p4_game.Resource][0]
+    world.unregister(resource)
+    self.assertIs(world.hierarchies[5], hierarchy)
+    for nest in world.objects_by_class[p4_game.Nest]:
+      waypoints = world.plan_path((5, 5), nest.position, 5)
+      self.assertEqual(waypoints[-1], nest.position)
+    self.assertEqual(world.path_fallbacks, 0)
+
+  def test_other_bin_size(self):
+    world = p4_game.World(800, 800, field_bin_size=12.5)
+    world.pathfinder = 'hpa'
+    world.populate(p4_brains.world_specification, {'slug': Idle, 'mantis': Idle})
+    self.assertEqual(world.hierarchies[5].shape, (64, 64))
+    slug = world.objects_by_class[p4_game.Slug][0]
+    nest = world.objects_by_class[p4_game.Nest][0]
+    slug.go_to(nest.position)
+    for k in range(20):
+      world.update(0.01)
+    self.assertTrue(world.field_builds > 0)
+
+if __name__ == '__main__':
+  unittest.main()
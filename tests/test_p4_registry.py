@@ -0,0 +1,83 @@
+import unittest
+import p4_game
+import p4_registry
+
+class RegistryTest(unittest.TestCase):
+
+  def test_keeps_insertion_order(self):
+    registry = p4_registry.Registry('abc')
+    self.assertFalse(registry.add('b'))
+    self.assertTrue(registry.add('d'))
+    self.assertTrue(registry.remove('b'))
+    self.assertFalse(registry.remove('b'))
+    self.assertEqual(list(registry), ['a', 'c', 'd'])
+    self.assertEqual(len(registry), 3)
+    self.assertIn('c', registry)
+    self.assertNotIn('b', registry)
+
+  def test_indexing(self):
+    registry = p4_registry.Registry(range(5))
+    registry.remove(1)
+    self.assertEqual((registry[0], registry[1], registry[-1]), (0, 2, 4))
+    self.assertEqual(registry[1:3], [2, 3])
+    self.assertRaises(IndexError, lambda: registry[4])
+
+  def test_removal_during_iteration(self):
+    registry = p4_registry.Registry(range(10))
+    seen = []
+    for k in registry:
+      seen.append(k)
+      registry.remove(k) # the current one
+      registry.remove(k + 1) # one not reached yet
+    self.assertEqual(seen, [0, 2, 4, 6, 8])
+    self.assertEqual(list(registry), [])
+
+  def test_additions_wait_for_the_next_pass(self):
+    registry = p4_registry.Registry([0, 1])
+    seen = [k for k in registry if registry.add(k + 10) or True]
+    self.assertEqual(seen, [0, 1])
+    self.assertEqual(list(registry), [0, 1, 10, 11])
+
+  def test_compaction_during_iteration(self):
+    n = 4*p4_registry.Registry.COMPACT_AT
+    registry = p4_registry.Registry(range(n))
+    seen = []
+    for k in registry:
+      seen.append(k)
+      if k == 0:
+        for other in range(1, n, 2):
+          registry.remove(other)
+        registry.add(n) # after the compaction
+    self.assertEqual(seen, range(0, n, 2))
+    self.assertEqual(registry.holes, 0)
+    self.assertEqual(list(registry), range(0, n, 2) + [n])
+    self.assertEqual([registry.index[k] for k in registry], range(len(registry)))
+
+class DeferredDestroyTest(unittest.TestCase):
+
+  def test_destroyed_during_a_tick_leave_at_its_end(self):
+    world = p4_game.World(400, 400)
+    slugs = []
+    for k in range(3):
+      slug = p4_game.Slug(world)
+      slug.position = (50 + 100*k, 200)
+      world.register(slug)
+      slugs.append(slug)
+
+    class Doomed(object):
+      # destroys every slug from the first one's controller
+      def update(self, obj, dt):
+        for slug in slugs:
+          slug.destroy()
+        self.alive = [s in world.all_objects for s in slugs]
+
+    doomed = slugs[0].controller = Doomed()
+    world.update(0.01)
+    self.assertEqual(doomed.alive, [True, True, True])
+    self.assertEqual(list(world.all_objects), [])
+    self.assertEqual(len(world.objects_by_class[p4_game.Slug]), 0)
+    slugs[1].destroy() # outside a tick it's right away, and harmless twice
+    self.assertEqual(world.entity(slugs[1].entity_id), None)
+
+if __name__ == '__main__':
+  unittest.main()
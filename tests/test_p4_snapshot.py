@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+import unittest
+import p4_brains
+import p4_game
+import p4_replay
+import p4_snapshot
+
+def state(world):
+  """everything about a world's objects that a run could change"""
+  rows = []
+  for obj in world.all_objects:
+    machine = getattr(obj.brain, 'stateMachine', None)
+    brain = machine.currentState.name if machine else getattr(obj.brain, 'state', None)
+    rows.append((obj.entity_id, obj.__class__.__name__, obj.position, obj.amount, brain))
+  return rows
+
+def new_world(storage=None, pathfinder='field'):
+  world = p4_game.World(400, 400, storage)
+  world.pathfinder = pathfinder
+  specification = dict(p4_brains.world_specification)
+  specification.update(slugs=8, mantises=4)
+  world.populate(specification, p4_brains.brain_classes)
+  return world
+
+def run(world, ticks):
+  for k in range(ticks):
+    if world.tick % 40 == 5:
+      slugs = list(world.objects_by_class[p4_game.Slug])
+      world.selection = dict((slug, True) for slug in slugs[world.tick % 3::2])
+      orders = ['h', (300.0, 100.0), 'b', (80.0, 320.0), 'a']
+      world.issue_selection_order(orders[world.tick % len(orders)])
+    world.update(0.01)
+
+class SnapshotTest(unittest.TestCase):
+
+  def check_continuation(self, world):
+    run(world, 60)
+    data = p4_snapshot.dumps(world)
+    run(world, 150)
+    copy = p4_snapshot.loads(data)
+    self.assertEqual(copy.tick, 60)
+    run(copy, 150)
+    self.assertEqual(state(copy), state(world))
+
+  def test_loaded_world_continues_the_same(self):
+    self.check_continuation(new_world())
+
+  def test_arrays_storage(self):
+    self.check_continuation(new_world('arrays'))
+
+  def test_hpa_pathfinder(self):
+    self.check_continuation(new_world(pathfinder='hpa'))
+
+  def test_with_fields_on_their_way(self):
+    world = new_world()
+    world.path_latency = 10
+    self.check_continuation(world)
+
+  def test_branches_agree(self):
+    world = new_world()
+    run(world, 30)
+    checkpoint = p4_snapshot.Checkpoint(world)
+    first = checkpoint.branch()
+    run(first, 100)
+    second = checkpoint.branch()
+    run(second, 100)
+    self.assertEqual(state(first), state(second))
+    self.assertEqual(world.tick, 30) # the original is left alone
+
+class ReplayTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def test_replay_reaches_the_recorded_state(self):
+    path = os.path.join(self.directory, 'session.ndjson')
+    world = p4_replay.record(path, 'p4_brains', 400, 400)
+    run(world, 200)
+    world.recorder.close(world.tick)
+
+    header, orders, end = p4_replay.load(path)
+    self.assertEqual(end, 200)
+    self.assertTrue(orders)
+    replayed = p4_replay.replay(header, orders, end)
+    self.assertEqual(state(replayed), state(world))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,116 @@
+import random
+import unittest
+import numpy
+import p4_brains
+import p4_game
+
+def world_with_followers(storage):
+  random.seed(3)
+  world = p4_game.World(800, 800, storage)
+  world.populate(p4_brains.world_specification, p4_brains.brain_classes)
+  slugs = list(world.objects_by_class[p4_game.Slug])
+  nests = list(world.objects_by_class[p4_game.Nest])
+  for k, slug in enumerate(slugs):
+    if k % 2:
+      slug.go_to((700.0, 100.0 + 40*k))
+    else:
+      slug.follow(nests[k % len(nests)])
+  for mantis in world.objects_by_class[p4_game.Mantis]:
+    mantis.go_to(nests[0])
+  return world
+
+def step(world, dt):
+  """the controller phase of World.update"""
+  if world.store is not None:
+    world.update_controllers(dt)
+  else:
+    for obj in world.all_objects:
+      obj.update(dt)
+
+def world_on_one_field(storage):
+  """a dozen slugs following one field, half with formation offsets and
+  two thirds in the last cell band by the right or bottom edge, where the
+  field has a missing corner"""
+  rng = random.Random(11)
+  world = p4_game.World(400, 300, storage)
+  for k in range(8):
+    obj = p4_game.Obstacle(world)
+    obj.position = (rng.uniform(60, 340), rng.uniform(60, 240))
+    obj.radius = rng.uniform(10, 30)
+    world.register(obj)
+  field = world.build_distance_field((200, 150), list(world.all_objects), 5)
+  for k in range(12):
+    slug = p4_game.Slug(world)
+    if k % 3 == 0:
+      slug.position = (rng.uniform(381, 399), rng.uniform(10, 290))
+    elif k % 3 == 1:
+      slug.position = (rng.uniform(10, 390), rng.uniform(281, 299))
+    else:
+      slug.position = (rng.uniform(10, 390), rng.uniform(10, 290))
+    world.register(slug)
+    offset = (rng.uniform(-15, 15), rng.uniform(-15, 15)) if k % 2 else None
+    slug.controller = p4_game.FieldFollower(field, offset)
+  return world, field
+
+class EntityStoreTest(unittest.TestCase):
+
+  def test_objects_keep_plain_attributes(self):
+    world = world_with_followers('arrays')
+    step(world, 0.01)
+    for name in ('position', 'radius', 'speed', 'amount'):
+      self.assertNotIn(name, vars(p4_game.GameObject))
+    slug = world.objects_by_class[p4_game.Slug][0]
+    self.assertIn('position', vars(slug))
+    world.unregister(slug)
+    self.assertEqual(type(slug.position), tuple)
+
+  def test_batches_move_like_single_updates(self):
+    objects = world_with_followers(None)
+    arrays = world_with_followers('arrays')
+    start = [obj.position for obj in arrays.all_objects]
+    for tick in range(100):
+      step(objects, 0.01)
+      step(arrays, 0.01)
+    self.assertNotEqual([obj.position for obj in arrays.all_objects], start)
+    for a, b in zip(objects.all_objects, arrays.all_objects):
+      self.assertEqual(a.entity_id, b.entity_id)
+      self.assertAlmostEqual(a.position[0], b.position[0], places=6)
+      self.assertAlmostEqual(a.position[1], b.position[1], places=6)
+
+  def test_field_followers_step_together(self):
+    objects, field = world_on_one_field(None)
+    arrays, batched_field = world_on_one_field('arrays')
+    slugs = list(arrays.objects_by_class[p4_game.Slug])
+    self.assertTrue(len(slugs) >= p4_game.FieldFollower.batch_minimum)
+    self.assertTrue(any(slug.controller.offset for slug in slugs))
+    def missing_corner(slug):
+      i = int(slug.position[0]/field.bin_size) - field.origin[0]
+      j = int(slug.position[1]/field.bin_size) - field.origin[1]
+      return numpy.isinf(field.values[i:i+2, j:j+2]).any()
+    self.assertTrue(any(missing_corner(slug) for slug in slugs))
+
+    # count the numpy steps
+    calls = []
+    gradient_many = batched_field.gradient_many
+    def counted(x, y, margin):
+      gx, gy, flowing = gradient_many(x, y, margin)
+      calls.append((len(x), int(flowing.sum())))
+      return gx, gy, flowing
+    batched_field.gradient_many = counted
+
+    start = [slug.position for slug in slugs]
+    for tick in range(50):
+      step(objects, 0.01)
+      step(arrays, 0.01)
+    self.assertNotEqual([slug.position for slug in slugs], start)
+    self.assertEqual(len(calls), 50)
+    self.assertTrue(0 < calls[0][1] < calls[0][0]) # some flow, some don't
+    for a, b in zip(objects.all_objects, arrays.all_objects):
+      self.assertAlmostEqual(a.position[0], b.position[0], places=6)
+      self.assertAlmostEqual(a.position[1], b.position[1], places=6)
+
+  def test_unknown_storage(self):
+    self.assertRaises(ValueError, p4_game.World, 800, 800, 'columns')
+
+if __name__ == '__main__':
+  unittest.main()
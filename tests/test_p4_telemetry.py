@@ -0,0 +1,37 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import p4_brains
+import p4_game
+
+class TelemetryTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def test_samples_count_the_work_since_the_last_one(self):
+    path = os.path.join(self.directory, 'samples.ndjson')
+    world = p4_game.World(400, 400)
+    world.populate(p4_brains.world_specification, p4_brains.brain_classes)
+    world.enable_telemetry(path, every=50)
+    world.selection = dict((slug, True) for slug in world.objects_by_class[p4_game.Slug])
+    world.issue_selection_order('h')
+    for k in range(200):
+      world.update(0.01)
+    world.disable_telemetry()
+
+    with open(path) as f:
+      samples = [json.loads(line) for line in f]
+    self.assertEqual([sample['tick'] for sample in samples], [50, 100, 150, 200])
+    self.assertEqual(sum(sample['nearest_searches'] for sample in samples), world.nearest_searches)
+    self.assertEqual(sum(sample['field_builds'] for sample in samples), world.field_builds)
+    self.assertTrue(world.nearest_searches > 0)
+    self.assertEqual(samples[-1]['population']['Slug'], len(world.objects_by_class[p4_game.Slug]))
+
+if __name__ == '__main__':
+  unittest.main()
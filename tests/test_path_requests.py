@@ -0,0 +1,83 @@
+import unittest
+import p4_brains
+import p4_game
+from tests.test_p4_hpa import Idle
+from tests.test_p4_snapshot import new_world, state
+
+ORDERS = [(300.0, 100.0), (80.0, 320.0), 'h', (200.0, 380.0), (20.0, 20.0), 'a']
+
+def deliveries(world, ticks):
+  """run world with a move order every 12 ticks, noting (tick, entity_id)
+  whenever a unit starts on a new field follower"""
+  seen = {}
+  handed = []
+  for k in range(ticks):
+    if world.tick % 12 == 3:
+      slugs = list(world.objects_by_class[p4_game.Slug])
+      world.selection = dict((slug, True) for slug in slugs[world.tick % 3::2])
+      world.issue_selection_order(ORDERS[world.tick // 12 % len(ORDERS)])
+    world.update(0.01)
+    for obj in world.all_objects:
+      controller = obj.controller
+      if isinstance(controller, p4_game.FieldFollower) and seen.get(obj) is not controller:
+        handed.append((world.tick, obj.entity_id))
+      seen[obj] = controller
+  return handed
+
+def idle_world():
+  world = p4_game.World(400, 400)
+  world.populate(p4_brains.world_specification, {'slug': Idle, 'mantis': Idle})
+  world.path_latency = 5
+  return world
+
+class PathRequestTest(unittest.TestCase):
+
+  def test_pool_hands_out_fields_like_inline_builds(self):
+    # brains draw on the shared random module, so each world is made and
+    # run before the next
+    inline = new_world()
+    inline.path_latency = 5
+    inline_handed = deliveries(inline, 200)
+    self.assertTrue(inline_handed)
+    pooled = new_world()
+    pooled.start_path_workers(processes=2, latency=5)
+    try:
+      pooled_handed = deliveries(pooled, 200)
+    finally:
+      pooled.stop_path_workers()
+    self.assertEqual(pooled.path_pool, None)
+    self.assertEqual(pooled_handed, inline_handed)
+    self.assertEqual(state(pooled), state(inline))
+
+  def test_units_keep_their_controller_until_the_field_is_due(self):
+    world = idle_world()
+    slug = world.objects_by_class[p4_game.Slug][0]
+    nest = world.objects_by_class[p4_game.Nest][0]
+    slug.follow(nest)
+    before = slug.controller
+    asked = world.tick
+    slug.go_to((390.0, 10.0))
+    self.assertIs(slug.controller, before)
+    request = slug.path_request
+    self.assertEqual(request.due, asked + 5)
+    while world.tick < asked + 4:
+      world.update(0.01)
+      self.assertIs(slug.controller, before)
+    world.update(0.01)
+    self.assertEqual(world.tick, request.due)
+    self.assertIsInstance(slug.controller, p4_game.FieldFollower)
+    self.assertIs(slug.controller.field, request.field)
+    self.assertEqual(slug.path_request, None)
+
+  def test_later_orders_drop_the_request(self):
+    world = idle_world()
+    slug = world.objects_by_class[p4_game.Slug][0]
+    nest = world.objects_by_class[p4_game.Nest][0]
+    slug.go_to((390.0, 10.0))
+    slug.follow(nest)
+    for k in range(6):
+      world.update(0.01)
+    self.assertIsInstance(slug.controller, p4_game.ObjectFollower)
+
+if __name__ == '__main__':
+  unittest.main()